@@ -0,0 +1,164 @@
+import numpy as np
+import pygame
+
+from car import CarSpecification
+from checkpoints import CheckpointSegments
+from sensors import RaySensors
+from stall import StallRules, StallTracker
+from timing import PhaseTimer
+from track_field import TrackDistanceField
+
+# columns of the actions array passed to BatchDrive.step
+THROTTLE, BRAKE, LEFT, RIGHT = range(4)
+
+
+class BatchDrive:
+    """
+    Headless counterpart of Drive that simulates a whole population of cars at once.
+    The state of every car is kept in NumPy arrays and advanced with array operations that follow the physics of
+    Car.rotate/accelerate/decelerate/brake/move. Collisions are looked up in the distance field of the track.
+    """
+
+    def __init__(self, track_border_image: pygame.Surface, car_image: pygame.Surface,
+                 car_specification: CarSpecification, checkpoints, start_position, start_angle, size,
+                 track_distance_field: TrackDistanceField = None, sensors: RaySensors = None,
+                 stall_rules: StallRules = None):
+        if track_distance_field is None:
+            track_distance_field = TrackDistanceField.from_border_image(track_border_image)
+        self.track_distance_field = track_distance_field
+        self.sensors = sensors
+        self.stall_rules = stall_rules
+        self.stall_tracker = None
+        self.timer = PhaseTimer()
+        # when enabled, the position, angle and actions of every car are kept for every step, see trajectory
+        self.recording = False
+        self.frames = []
+        self.steps = None
+
+        self.car_specification = car_specification
+        self.car_width, self.car_height = car_image.get_width(), car_image.get_height()
+
+        self.checkpoints = np.array(checkpoints, dtype=np.float64)  # (checkpoints, 2 points, xy)
+        self.checkpoint_segments = CheckpointSegments(checkpoints)
+        self.start_position = start_position
+        self.start_angle = start_angle
+        self.size = size
+
+        self.x = self.y = self.angle = self.speed = None
+        self.previous_x = self.previous_y = None
+        self.checkpoint_counter = None
+        self.alive = self.crashed = None
+        self.restart()
+
+    def restart(self, size=None):
+        if size is not None:
+            self.size = size
+        self.x = np.full(self.size, self.start_position[0], dtype=np.float64)
+        self.y = np.full(self.size, self.start_position[1], dtype=np.float64)
+        self.previous_x, self.previous_y = self.x.copy(), self.y.copy()
+        self.angle = np.full(self.size, self.start_angle, dtype=np.float64)
+        self.speed = np.zeros(self.size, dtype=np.float64)
+        self.checkpoint_counter = np.zeros(self.size, dtype=np.int64)
+        self.alive = np.ones(self.size, dtype=bool)
+        self.crashed = np.zeros(self.size, dtype=bool)  # cars which hit the border, not retired for stalling
+        self.steps = np.zeros(self.size, dtype=np.int64)
+        self.frames = []
+        if self.stall_rules is not None and self.stall_rules.enabled():
+            self.stall_tracker = StallTracker(self.stall_rules, self.size)
+
+    def current_checkpoints(self, offset=0):
+        return self.checkpoints[(self.checkpoint_counter + offset) % len(self.checkpoints)]
+
+    def get_states(self, cars=None):
+        """
+        :param cars: indices (or a boolean mask) of the cars, None for all of them
+        :return: states with the same layout as Drive.get_state, one row per car
+        """
+        if cars is None:
+            cars = slice(None)
+        x, y, angle = self.x[cars], self.y[cars], self.angle[cars]
+        checkpoint = self.current_checkpoints()[cars]
+        state = [x, y, angle, self.speed[cars], checkpoint.reshape(-1, 4)]
+        if self.sensors is not None:
+            state.append(self.sensors.cast(self.track_distance_field, x, y, angle))
+        return np.column_stack(state)
+
+    def rotate(self, cars, direction):
+        spec = self.car_specification
+        # the faster you go, the less you can steer
+        angle = (-spec.max_angle * self.speed[cars]) / (4 * spec.max_speed) + spec.max_angle
+        self.angle[cars] = np.mod(self.angle[cars] + direction * angle, 360)
+
+    def move_players(self, actions, cars):
+        spec = self.car_specification
+        throttle = cars & actions[:, THROTTLE]
+        brake = cars & actions[:, BRAKE]
+
+        # steering is applied one direction after another, exactly like Car.move_player
+        self.rotate(cars & actions[:, LEFT], 1)
+        self.rotate(cars & actions[:, RIGHT], -1)
+
+        coasting = cars & ~throttle & ~brake
+        self.speed[coasting] = np.maximum(self.speed[coasting] - spec.deceleration, 0)
+        self.speed[throttle] = np.minimum(self.speed[throttle] + spec.acceleration, spec.max_speed)
+        self.speed[brake] = np.maximum(self.speed[brake] - spec.brake_power, 0)
+
+        angle = np.radians(self.angle[cars])
+        self.previous_x[cars], self.previous_y[cars] = self.x[cars], self.y[cars]
+        self.x[cars] -= np.sin(angle) * self.speed[cars]
+        self.y[cars] -= np.cos(angle) * self.speed[cars]
+
+    def check_checkpoint_pass(self, cars):
+        indices = self.checkpoint_counter[cars] % len(self.checkpoint_segments)
+        crossed = self.checkpoint_segments.crossed_many(indices, self.previous_x[cars], self.previous_y[cars],
+                                                        self.x[cars], self.y[cars])
+        passed = np.flatnonzero(cars)[crossed]
+        self.checkpoint_counter[passed] += 1
+
+    def collide(self, cars):
+        collided = np.zeros(self.size, dtype=bool)
+        collided[cars] = self.track_distance_field.collides(self.x[cars], self.y[cars], self.angle[cars],
+                                                            self.car_width, self.car_height)
+        return collided
+
+    def step(self, actions):
+        """
+        Advances every car that is still alive by one tick.
+        :param actions: array of shape (size, 4) with throttle, brake, left and right flags of every car
+        :return: boolean array, True for every car which crashed or was retired for stalling in this step
+        """
+        actions = np.asarray(actions, dtype=bool)
+        cars = self.alive.copy()
+
+        with self.timer.phase("physics"):
+            self.move_players(actions, cars)
+        with self.timer.phase("checkpoint"):
+            self.check_checkpoint_pass(cars)
+        with self.timer.phase("collision"):
+            game_over = self.collide(cars)
+        self.crashed |= game_over
+        if self.stall_tracker is not None:
+            with self.timer.phase("stall"):
+                distance = self.checkpoint_segments.distance_to_midpoint(
+                    self.checkpoint_counter % len(self.checkpoint_segments), self.x, self.y)
+                game_over |= self.stall_tracker.update(cars, self.checkpoint_counter, self.speed, distance)
+
+        self.steps[cars] += 1
+        if self.recording:
+            # the bits of the packed actions are ACTION_THROTTLE, ACTION_BRAKE, ACTION_LEFT and ACTION_RIGHT
+            self.frames.append((self.x.astype(np.float32), self.y.astype(np.float32), self.angle.astype(np.float32),
+                                np.packbits(actions, axis=1, bitorder="little")[:, 0]))
+
+        self.alive &= ~game_over
+        return game_over
+
+    def trajectory(self, car):
+        """
+        :param car: index of the car
+        :return: x, y, angle and packed actions of the car in every step it made while recording
+        """
+        frames = self.frames[:self.steps[car]]
+        return tuple(np.array([frame[i][car] for frame in frames]) for i in range(4))
+
+    def finished(self):
+        return not self.alive.any()
@@ -0,0 +1,83 @@
+"""
+Headless training benchmark, e.g.
+    python benchmark.py --generations 10 --population 200 --output benchmark.json
+runs the given number of generations on every track with a fixed seed and reports steps per second, generations per
+minute and the wall time of every phase of the training.
+"""
+import argparse
+import json
+import os
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # never open a window
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from train import add_trainer_arguments, configure_trainer
+from tracks import find_track_files
+from trainer import Trainer
+
+TRACK_DIRECTORIES = ["data/track1", "data/track2", "data/track3"]
+
+
+def benchmark_track(track_directory, args):
+    trainer = Trainer(*find_track_files(track_directory))
+    configure_trainer(trainer, args)
+    trainer.create_new_population()
+
+    car_steps = 0
+    start = time.perf_counter()
+    for _ in range(args.generations):
+        trainer.train_generation()
+        # generations served by the fitness cache simulate no car steps
+        car_steps += trainer.evaluated_car_steps or 0
+    total = time.perf_counter() - start
+
+    phases = trainer.timer.as_dict()
+    if args.engine == "batch":
+        # physics, collision, checkpoint and inference are measured inside the batch engine
+        phases.update(trainer.get_evaluator().timer.as_dict())
+    trainer.close()
+
+    return {
+        "track": track_directory,
+        "engine": args.engine,
+        "backend": args.backend,
+        "generations": args.generations,
+        "population": args.population,
+        "ticks": args.ticks,
+        "architecture": trainer.architecture.as_dict(),
+        "seed": args.seed,
+        "total_seconds": total,
+        "steps_per_second": car_steps / phases["evaluation"] if car_steps else None,
+        "generations_per_minute": args.generations / total * 60,
+        "best_checkpoints": [best for _, _, best in trainer.generation_stats],
+        "phases": phases,
+        "fitness_cache": trainer.fitness_cache.stats(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the training on the bundled tracks.")
+    parser.add_argument("--tracks", nargs="+", default=TRACK_DIRECTORIES, help="track directories")
+    parser.add_argument("--generations", type=int, default=5)
+    add_trainer_arguments(parser)
+    # a bigger population than for training and a fixed seed, so that runs are comparable
+    parser.set_defaults(population=200, seed=0)
+    parser.add_argument("--output", default="benchmark.json", help="JSON file with the results")
+    args = parser.parse_args()
+
+    results = []
+    for track_directory in args.tracks:
+        result = benchmark_track(track_directory, args)
+        results.append(result)
+        print(f"{track_directory}: {result['generations_per_minute']:.1f} generations/min, "
+              f"{result['steps_per_second'] or 0:.0f} steps/s")
+        for phase, seconds in sorted(result["phases"].items()):
+            print(f"    {phase}: {seconds:.3f} s")
+
+    with open(args.output, 'w') as file:
+        json.dump(results, file, indent=4)
+
+
+if __name__ == '__main__':
+    main()
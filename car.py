@@ -1,12 +1,18 @@
 import math
-from collections import namedtuple
 
 import pygame
 
-from utilities import rotate_image, distance_from_point_and_line
+from checkpoints import CheckpointSegments
+from utilities import ACTION_THROTTLE, ACTION_BRAKE, ACTION_LEFT, ACTION_RIGHT
+
+
+CAR_IMAGE_PATH = "data/car.png"
+CAR_SCALE = 0.5
 
 
 class CarSpecification:
+    __slots__ = ("acceleration", "brake_power", "deceleration", "max_speed", "max_angle")
+
     def __init__(self, acceleration, deceleration, brake_power, max_speed, max_angle):
         self.acceleration = acceleration
         self.brake_power = brake_power
@@ -15,8 +21,54 @@ class CarSpecification:
         self.max_angle = max_angle
 
 
+def default_car_specification():
+    return CarSpecification(
+        acceleration=0.2,
+        deceleration=0.2,
+        brake_power=0.5,
+        max_speed=10,
+        max_angle=4
+    )
+
+
+class CarAtlasEntry:
+    def __init__(self, image, mask, pivot_offset):
+        self.image = image
+        self.mask = mask
+        # vector from the pivot of the car to the centre of the rotated image
+        self.pivot_offset = pivot_offset
+
+
+class CarAtlas:
+    """
+    Rotated car images and their masks for every quantized angle, built once per car image, so that moving a car and
+    checking its collisions doesn't have to rotate the image and rebuild its mask every tick.
+    """
+
+    def __init__(self, car_image, angle_step=1.0):
+        self.angle_step = angle_step
+        self.entries = []
+        width, height = car_image.get_width(), car_image.get_height()
+        # same pivot as rotate_image when rotating around the centre of the image
+        offset_center_to_pivot = pygame.math.Vector2(width / 2, height / 2) - car_image.get_rect().center
+        for i in range(round(360 / angle_step)):
+            angle = i * angle_step
+            image = pygame.transform.rotate(car_image, angle)
+            self.entries.append(CarAtlasEntry(image, pygame.mask.from_surface(image),
+                                              -offset_center_to_pivot.rotate(-angle)))
+
+    def get(self, angle) -> CarAtlasEntry:
+        return self.entries[round(angle / self.angle_step) % len(self.entries)]
+
+
 class Car:
-    def __init__(self, car_specification: CarSpecification, car_image, start_angle=0, start_position=(0, 0)):
+    # the specification is copied into slots, reading them every tick is faster than going through the specification
+    __slots__ = ("acceleration", "brake_power", "deceleration", "max_speed", "max_angle", "speed", "angle", "x", "y",
+                 "previous_x", "previous_y", "original_image", "image", "width", "height", "image_rect", "mask",
+                 "car_atlas")
+
+    def __init__(self, car_specification: CarSpecification, car_image, start_angle=0, start_position=(0, 0),
+                 car_atlas: CarAtlas = None):
         self.acceleration = car_specification.acceleration
         self.brake_power = car_specification.brake_power
         self.deceleration = car_specification.deceleration
@@ -25,10 +77,13 @@ class Car:
         self.speed = 0
         self.angle = start_angle
         self.x, self.y = start_position
+        self.previous_x, self.previous_y = self.x, self.y
         self.original_image = self.image = car_image
         self.width, self.height = car_image.get_width(), car_image.get_height()
 
         self.image_rect = self.image.get_rect()
+        self.mask = pygame.mask.from_surface(self.image)
+        self.car_atlas = car_atlas if car_atlas is not None else CarAtlas(car_image)
 
     def rotate(self, left=False, right=False):
         # the faster you go, the less you can steer
@@ -50,10 +105,9 @@ class Car:
         self.speed = max(self.speed - self.brake_power, 0)
 
     def collide(self, mask, x=0, y=0):
-        car_mask = pygame.mask.from_surface(self.image)
         offset_x, offset_y, _, _ = self.image_rect
         offset = (offset_x - x, offset_y - y)
-        intersection_point = mask.overlap(car_mask, offset)
+        intersection_point = mask.overlap(self.mask, offset)
         return intersection_point
 
     def move(self):
@@ -61,36 +115,35 @@ class Car:
         vertical_velocity = math.cos(angle) * self.speed
         horizontal_velocity = math.sin(angle) * self.speed
 
+        self.previous_x, self.previous_y = self.x, self.y
         self.x -= horizontal_velocity
         self.y -= vertical_velocity
 
-    def move_player(self, action: namedtuple):
-        if action.left:
+    def move_player(self, action: int):
+        """
+        :param action: ACTION_THROTTLE, ACTION_BRAKE, ACTION_LEFT and ACTION_RIGHT bits of utilities
+        """
+        if action & ACTION_LEFT:
             self.rotate(left=True)
-        if action.right:
+        if action & ACTION_RIGHT:
             self.rotate(right=True)
-        if not action.throttle and not action.brake:
+        if not action & (ACTION_THROTTLE | ACTION_BRAKE):
             self.decelerate()
         else:
-            if action.throttle:
+            if action & ACTION_THROTTLE:
                 self.accelerate()
-            if action.brake:
+            if action & ACTION_BRAKE:
                 self.brake()
 
         self.move()
 
         # get current car position with rotation after moving
-        self.image, self.image_rect = rotate_image(self.original_image, (self.x, self.y),
-                                                   (self.width / 2, self.height / 2), self.angle)
-
-    def get_distance_from_checkpoint(self, checkpoint):
-        return distance_from_point_and_line(checkpoint[0], checkpoint[1], (self.x, self.y))
+        entry = self.car_atlas.get(self.angle)
+        self.image, self.mask = entry.image, entry.mask
+        self.image_rect = self.image.get_rect(center=(self.x + entry.pivot_offset.x, self.y + entry.pivot_offset.y))
 
-    def check_checkpoint_pass(self, distance):
-        if distance < self.width:
-            return True
-        else:
-            return False
+    def check_checkpoint_pass(self, checkpoint_segments: CheckpointSegments, index):
+        return checkpoint_segments.crossed(index, (self.previous_x, self.previous_y), (self.x, self.y))
 
     def draw(self, window):
         window.blit(self.image, self.image_rect)
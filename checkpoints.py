@@ -0,0 +1,59 @@
+import numpy as np
+
+
+class CheckpointSegments:
+    """
+    Geometry of the checkpoints of a track precomputed once: start point, unit direction, unit normal and length of
+    every checkpoint segment. A checkpoint is passed when the car moves across the segment itself, not just close
+    to the line going through it.
+    """
+
+    def __init__(self, checkpoints):
+        points = np.asarray(checkpoints, dtype=np.float64).reshape(-1, 2, 2)
+        self.start = points[:, 0]
+        vector = points[:, 1] - self.start
+        # zero length checkpoints can't be crossed, but mustn't divide by zero
+        self.length = np.hypot(vector[:, 0], vector[:, 1])
+        self.direction = vector / np.maximum(self.length, 1e-9)[:, np.newaxis]
+        self.normal = np.column_stack((-self.direction[:, 1], self.direction[:, 0]))
+        self.midpoint = self.start + vector / 2
+        # plain rows for checking a single car without numpy overhead
+        self._rows = np.column_stack((self.start, self.direction, self.normal, self.length)).tolist()
+
+    def __len__(self):
+        return len(self.length)
+
+    def distance_to_midpoint(self, indices, x, y):
+        midpoint = self.midpoint[indices]
+        return np.hypot(x - midpoint[..., 0], y - midpoint[..., 1])
+
+    def crossed(self, index, previous_position, position) -> bool:
+        start_x, start_y, direction_x, direction_y, normal_x, normal_y, length = self._rows[index]
+        previous_side = (previous_position[0] - start_x) * normal_x + (previous_position[1] - start_y) * normal_y
+        side = (position[0] - start_x) * normal_x + (position[1] - start_y) * normal_y
+        if previous_side * side > 0 or previous_side == side:
+            return False
+        # point where the movement crosses the line of the checkpoint
+        fraction = previous_side / (previous_side - side)
+        crossing_x = previous_position[0] + fraction * (position[0] - previous_position[0])
+        crossing_y = previous_position[1] + fraction * (position[1] - previous_position[1])
+        along = (crossing_x - start_x) * direction_x + (crossing_y - start_y) * direction_y
+        return 0 <= along <= length
+
+    def crossed_many(self, indices, previous_x, previous_y, x, y):
+        """
+        Vectorized crossed for many cars.
+        :param indices: index of the checkpoint of every car
+        :return: boolean array, True for every car which crossed its checkpoint
+        """
+        start, direction, normal = self.start[indices], self.direction[indices], self.normal[indices]
+        previous_side = (previous_x - start[:, 0]) * normal[:, 0] + (previous_y - start[:, 1]) * normal[:, 1]
+        side = (x - start[:, 0]) * normal[:, 0] + (y - start[:, 1]) * normal[:, 1]
+        crossing_line = (previous_side * side <= 0) & (previous_side != side)
+        # cars which didn't cross the line divide by zero here, they are masked out by crossing_line
+        with np.errstate(divide="ignore", invalid="ignore"):
+            fraction = previous_side / (previous_side - side)
+            crossing_x = previous_x + fraction * (x - previous_x)
+            crossing_y = previous_y + fraction * (y - previous_y)
+            along = (crossing_x - start[:, 0]) * direction[:, 0] + (crossing_y - start[:, 1]) * direction[:, 1]
+        return crossing_line & (along >= 0) & (along <= self.length[indices])
@@ -2,6 +2,8 @@ import math
 
 import pygame
 
+from render import DirtyRenderer
+
 MOUSE_BUTTON_LEFT = 1
 COLOR_RED = pygame.color.Color(255, 0, 0)
 COLOR_BLUE = pygame.color.Color(0, 0, 255)
@@ -17,10 +19,12 @@ class Create:
         self.new_checkpoint_left_point = None
         self.start_position = (0, 0)
         self.start_angle = 0
+        # only the lines and the start are redrawn every frame
+        self.renderer = DirtyRenderer(window, track_image)
 
     def draw(self):
-        self.window.fill((12, 145, 18))  # grass background
-        self.window.blit(self.track_image, (0, 0))
+        renderer = self.renderer
+        renderer.begin()
 
         ticks = pygame.time.get_ticks()
 
@@ -28,11 +32,11 @@ class Create:
             first_point = checkpoint[0]
             second_point = checkpoint[1]
             color = (ticks // 2) % 255
-            pygame.draw.line(self.window, (color, 0, 0), first_point, second_point, 5)
+            renderer.line((color, 0, 0), first_point, second_point, 5)
 
         if self.creating_checkpoints:
             if self.new_checkpoint_left_point is not None:
-                pygame.draw.line(self.window, COLOR_RED, self.new_checkpoint_left_point, pygame.mouse.get_pos(), 5)
+                renderer.line(COLOR_RED, self.new_checkpoint_left_point, pygame.mouse.get_pos(), 5)
 
         else:  # creating start
             first_point = self.start_position
@@ -40,10 +44,10 @@ class Create:
             vector = (second_point[0] - first_point[0], second_point[1] - first_point[1])
             new_vector = pygame.math.Vector2.rotate(pygame.math.Vector2(vector), self.start_angle)
             second_point = (first_point[0] + new_vector.x, first_point[1] + new_vector.y)
-            pygame.draw.circle(self.window, COLOR_BLUE, first_point, 5)
-            pygame.draw.line(self.window, COLOR_BLUE, first_point, second_point, 5)
+            renderer.circle(COLOR_BLUE, first_point, 5)
+            renderer.line(COLOR_BLUE, first_point, second_point, 5)
 
-        pygame.display.update()
+        renderer.end()
 
     def handle_events(self):
         stop = False
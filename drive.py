@@ -1,7 +1,12 @@
 import numpy as np
 import pygame
 
-from car import Car, CarSpecification
+from car import Car, CarSpecification, CarAtlas
+from checkpoints import CheckpointSegments
+from render import DirtyRenderer
+from sensors import RaySensors
+from stall import StallRules, StallTracker
+from track_field import TrackDistanceField
 
 MOUSE_BUTTON_LEFT = 1
 COLOR_RED = pygame.color.Color(255, 0, 0)
@@ -9,35 +14,60 @@ COLOR_RED = pygame.color.Color(255, 0, 0)
 
 class Drive:
     def __init__(self, window: pygame.display, track_image: pygame.image, track_border_image: pygame.image, car_image,
-                 car_specification: CarSpecification, checkpoints, start_position, start_angle):
+                 car_specification: CarSpecification, checkpoints, start_position, start_angle,
+                 car_atlas: CarAtlas = None, track_border_mask: pygame.mask.Mask = None,
+                 track_distance_field: TrackDistanceField = None, sensors: RaySensors = None,
+                 stall_rules: StallRules = None):
         self.window = window
 
         self.car_image = car_image
+        self.car_atlas = car_atlas if car_atlas is not None else CarAtlas(car_image)
         self.track = track_image
         self.track_border = track_border_image
-        self.track_border_mask = pygame.mask.from_surface(self.track_border)
-        self.track_width = track_image.get_width()
-        self.track_height = track_image.get_height()
+        if track_border_mask is None and track_distance_field is None:
+            track_border_mask = pygame.mask.from_surface(self.track_border)
+        self.track_border_mask = track_border_mask
+        # when given, collisions are looked up in the distance field instead of comparing the masks
+        self.track_distance_field = track_distance_field
+        self.sensors = sensors
+        if sensors is not None and track_distance_field is None:
+            # the rays are cast through the distance field, but the collisions keep using the masks
+            self.sensors_field = TrackDistanceField.from_border_image(track_border_image)
+        else:
+            self.sensors_field = track_distance_field
+        if track_image is not None:
+            self.track_width, self.track_height = track_image.get_size()
+        else:
+            # headless drives only have the distance field of the track
+            self.track_width, self.track_height = track_distance_field.width, track_distance_field.height
 
         self.car_specification = car_specification
         self.start_angle = start_angle
         self.start_position = start_position
         self.player_car = self.initialise_car()
 
-        self.images = [(self.track, (0, 0))]
+        # only the car and the checkpoint lines are redrawn every frame, headless drives have no window
+        self.renderer = DirtyRenderer(window, track_image) if window is not None else None
         self.checkpoints = checkpoints
+        self.checkpoint_segments = CheckpointSegments(checkpoints)
         self.showing_checkpoints = True
         self.checkpoint_counter = 0
+        # why the last step ended the run
+        self.crashed = self.stalled = False
+        self.stall_rules = stall_rules
+        self.stall_tracker = self.initialise_stall_tracker()
 
     def initialise_car(self):
         return Car(self.car_specification,
                    self.car_image,
                    self.start_angle,
-                   self.start_position)
+                   self.start_position,
+                   self.car_atlas)
 
-    def get_distance_from_checkpoint(self):
-        return self.player_car.get_distance_from_checkpoint(
-            self.checkpoints[self.checkpoint_counter % len(self.checkpoints)])
+    def initialise_stall_tracker(self):
+        if self.stall_rules is None or not self.stall_rules.enabled():
+            return None
+        return StallTracker(self.stall_rules, 1)
 
     def get_state(self):
         # next 3 checkpoints
@@ -76,14 +106,17 @@ class Drive:
             # checkpoint_3[1][1],  # right point y
         ]
 
+        if self.sensors is not None:
+            state.extend(self.sensors.cast_one(self.sensors_field, self.player_car.x, self.player_car.y,
+                                               self.player_car.angle))
+
         return np.array(state, dtype=np.float64)
 
     def draw(self):
-        self.window.fill((12, 145, 18))
-
-        self.window.blit(self.track, (0, 0))
+        renderer = self.renderer
+        renderer.begin()
 
-        self.player_car.draw(self.window)
+        renderer.blit(self.player_car.image, self.player_car.image_rect)
 
         if self.showing_checkpoints:
             # get next 3 checkpoints
@@ -93,11 +126,11 @@ class Drive:
             next_next_checkpoint = self.checkpoints[(self.checkpoint_counter + 2) % len_checkpoints]
 
             # draw next checkpoints lines
-            pygame.draw.line(self.window, COLOR_RED, current_checkpoint[0], current_checkpoint[1], 5)
-            pygame.draw.line(self.window, COLOR_RED, next_checkpoint[0], next_checkpoint[1], 5)
-            pygame.draw.line(self.window, COLOR_RED, next_next_checkpoint[0], next_next_checkpoint[1], 5)
+            renderer.line(COLOR_RED, current_checkpoint[0], current_checkpoint[1], 5)
+            renderer.line(COLOR_RED, next_checkpoint[0], next_checkpoint[1], 5)
+            renderer.line(COLOR_RED, next_next_checkpoint[0], next_next_checkpoint[1], 5)
 
-        pygame.display.update()
+        renderer.end()
 
     def handle_events(self):
         stop = False
@@ -120,17 +153,32 @@ class Drive:
     def restart(self):
         self.player_car = self.initialise_car()
         self.checkpoint_counter = 0
+        self.crashed = self.stalled = False
+        self.stall_tracker = self.initialise_stall_tracker()
 
     def step(self, action) -> bool:
         game_over = False
 
         self.player_car.move_player(action)
 
-        checkpoint_passed = self.player_car.check_checkpoint_pass(self.get_distance_from_checkpoint())
+        checkpoint_passed = self.player_car.check_checkpoint_pass(self.checkpoint_segments,
+                                                                  self.checkpoint_counter % len(self.checkpoints))
         if checkpoint_passed:
             self.checkpoint_counter += 1
 
-        if self.player_car.collide(self.track_border_mask):
-            game_over = True
+        if self.track_distance_field is not None:
+            car = self.player_car
+            if self.track_distance_field.collides(car.x, car.y, car.angle, car.width, car.height):
+                game_over = self.crashed = True
+        elif self.player_car.collide(self.track_border_mask):
+            game_over = self.crashed = True
+
+        if self.stall_tracker is not None:
+            car = self.player_car
+            index = self.checkpoint_counter % len(self.checkpoints)
+            distance = self.checkpoint_segments.distance_to_midpoint(index, car.x, car.y)
+            if self.stall_tracker.update(np.ones(1, dtype=bool), np.array([self.checkpoint_counter]),
+                                         np.array([car.speed]), np.array([distance]))[0]:
+                game_over = self.stalled = True
 
         return game_over
@@ -0,0 +1,305 @@
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+import pygame
+
+from batch_drive import BatchDrive
+from car import CarSpecification, CarAtlas
+from drive import Drive
+from network import Architecture, PopulationNetwork, game_model_sizes
+from sensors import RaySensors
+from stall import StallRules
+from track_field import TrackDistanceField
+from track_bundle import TrackBundle
+from utilities import scale_image, action_from_keys
+
+# assets of the track loaded once by every worker process and reused for every evaluated model
+_worker_assets = None
+_worker_architecture = None
+
+
+class RunSummary:
+    def __init__(self, checkpoints, ticks, lap_ticks, end, position):
+        """
+        :param checkpoints: number of passed checkpoints
+        :param ticks: number of simulation steps of the run
+        :param lap_ticks: tick in which every completed lap ended
+        :param end: why the run ended, "crash", "stall", "ticks", "time" or "stopped"
+        :param position: x and y of the car at the end of the run, e.g. where it crashed
+        """
+        self.checkpoints = checkpoints
+        self.ticks = ticks
+        self.lap_ticks = lap_ticks
+        self.end = end
+        self.position = position
+
+    @property
+    def laps(self):
+        return len(self.lap_ticks)
+
+    def best_lap_ticks(self):
+        laps = [end - start for start, end in zip([0] + self.lap_ticks, self.lap_ticks)]
+        return min(laps) if laps else None
+
+    def as_dict(self):
+        return {"checkpoints": self.checkpoints, "ticks": self.ticks, "laps": self.laps,
+                "lap_ticks": self.lap_ticks, "best_lap_ticks": self.best_lap_ticks(), "end": self.end,
+                "x": self.position[0], "y": self.position[1]}
+
+    def __str__(self):
+        return (f"checkpoints: {self.checkpoints}, laps: {self.laps}, best lap: {self.best_lap_ticks()} ticks, "
+                f"ended by {self.end} after {self.ticks} ticks at ({self.position[0]:.0f}, {self.position[1]:.0f})")
+
+
+def run_model(drive: Drive, policy, max_ticks=None, deadline=None, render_every=0, clock=None, fps=None):
+    """
+    Drives the car until it crashes, stalls or runs out of ticks or time.
+    :param drive: drive to run the car in
+    :param policy: function choosing the action from the state of the drive
+    :param max_ticks: number of simulation steps after which the run ends, None for no limit
+    :param deadline: time.monotonic() value after which the run ends, None for no limit
+    :param render_every: draw every render_every-th tick, 0 to never draw
+    :param clock: clock limiting the drawn frames to fps, None to run at full speed
+    :return: RunSummary of the run
+    """
+    ticks = 0
+    lap_ticks = []
+    checkpoints_per_lap = len(drive.checkpoints)
+    while True:
+        action = policy(drive.get_state())
+        if render_every and ticks % render_every == 0:
+            drive.draw()
+            if clock is not None:
+                clock.tick(fps)
+            if drive.handle_events():
+                return drive_summary(drive, ticks, lap_ticks, "stopped")
+        game_over = drive.step(action)
+        ticks += 1
+        if drive.checkpoint_counter >= (len(lap_ticks) + 1) * checkpoints_per_lap:
+            lap_ticks.append(ticks)
+
+        if game_over:
+            return drive_summary(drive, ticks, lap_ticks, "crash" if drive.crashed else "stall")
+        if max_ticks is not None and ticks >= max_ticks:
+            return drive_summary(drive, ticks, lap_ticks, "ticks")
+        if deadline is not None and time.monotonic() > deadline:
+            return drive_summary(drive, ticks, lap_ticks, "time")
+
+
+def drive_summary(drive: Drive, ticks, lap_ticks, end):
+    return RunSummary(drive.checkpoint_counter, ticks, lap_ticks, end, (drive.player_car.x, drive.player_car.y))
+
+
+def evaluate_model(drive: Drive, policy, max_ticks=None, deadline=None):
+    """
+    :return: number of checkpoints passed by the car until it crashes or runs out of ticks or time, see run_model
+    """
+    return run_model(drive, policy, max_ticks, deadline).checkpoints
+
+
+def network_policy(network: PopulationNetwork):
+    """
+    :param network: network of a single model
+    :return: policy choosing the action of the car with the network, for run_model
+    """
+    return lambda state: action_from_keys(network.predict_actions(state[np.newaxis])[0].tolist())
+
+
+def _initialise_worker(track_border_image_path, track_data_path, car_image_path, car_scale, car_specification,
+                       sensors, stall_rules, architecture):
+    global _worker_assets, _worker_architecture
+    # surfaces can't be sent between processes, so every worker loads the car image itself and memory maps the track
+    car_image = scale_image(pygame.image.load(car_image_path), car_scale)
+    bundle = TrackBundle.load_or_compile(track_border_image_path, track_data_path)
+    _worker_assets = dict(track_image=None,
+                          track_border_image=None,
+                          car_image=car_image,
+                          car_specification=car_specification,
+                          checkpoints=bundle.checkpoints,
+                          start_position=bundle.start_position,
+                          start_angle=bundle.start_angle,
+                          car_atlas=CarAtlas(car_image),
+                          track_distance_field=bundle.distance_field,
+                          sensors=sensors,
+                          stall_rules=stall_rules)
+    _worker_architecture = architecture or Architecture()
+
+
+def _evaluate_in_worker(task):
+    model_vector, max_ticks, deadline, time_budget = task
+    if time_budget is not None:
+        # the clock starts with the run, not when the model was queued, so models waiting for a free worker get the
+        # same time as the first ones
+        deadline = time.monotonic() + time_budget
+    drive = Drive(None, **_worker_assets)
+    sensors = _worker_assets["sensors"]
+    network = PopulationNetwork(model_vector,
+                                game_model_sizes(sensors.count if sensors is not None else 0, _worker_architecture),
+                                activation=_worker_architecture.activation)
+    summary = run_model(drive, network_policy(network), max_ticks, deadline)
+    return summary.checkpoints, summary.ticks
+
+
+class PopulationEvaluator:
+    """
+    Evaluates models in a pool of processes. Every worker maps the track bundle once, after that only the flattened
+    weights of the models (torchga.model_weights_as_vector) are sent to the workers and the fitness and the number of
+    simulated ticks are sent back.
+    The workers run the networks with the numpy backend of PopulationNetwork, so they don't need torch.
+    """
+
+    def __init__(self, track_border_image_path, track_data_path, car_image_path, car_scale,
+                 car_specification: CarSpecification, workers=None, sensors: RaySensors = None,
+                 stall_rules: StallRules = None, architecture: Architecture = None):
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.pool = Pool(self.workers, initializer=_initialise_worker,
+                         initargs=(track_border_image_path, track_data_path, car_image_path, car_scale,
+                                   car_specification, sensors, stall_rules, architecture))
+        # simulation steps of all the cars in the last evaluation
+        self.car_steps = 0
+
+    def evaluate(self, model_vectors, max_ticks=None, deadline=None, time_budget=None):
+        """
+        :param model_vectors: flattened weights of every model
+        :param max_ticks: number of simulation steps of each run, None for no limit
+        :param deadline: time.monotonic() value after which every run ends, None for no limit
+        :param time_budget: seconds every run may take from its own start, None for no limit
+        :return: list with the number of passed checkpoints of every model
+        """
+        tasks = [(model_vector, max_ticks, deadline, time_budget) for model_vector in model_vectors]
+        results = self.pool.map(_evaluate_in_worker, tasks, chunksize=1)
+        self.car_steps = sum(ticks for _, ticks in results)
+        return [checkpoints for checkpoints, _ in results]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+
+class BatchEvaluator:
+    """
+    Evaluates the whole population in the current process, simulating all the cars at once with BatchDrive and
+    choosing all their actions at once with PopulationNetwork.
+    """
+
+    def __init__(self, track_border_image: pygame.Surface, car_image: pygame.Surface,
+                 car_specification: CarSpecification, checkpoints, start_position, start_angle, backend="numpy",
+                 track_distance_field: TrackDistanceField = None, sensors: RaySensors = None,
+                 stall_rules: StallRules = None, architecture: Architecture = None):
+        self.drive = BatchDrive(track_border_image, car_image, car_specification, checkpoints, start_position,
+                                start_angle, 0, track_distance_field, sensors, stall_rules)
+        self.backend = backend
+        self.architecture = architecture or Architecture()
+        self.sizes = game_model_sizes(sensors.count if sensors is not None else 0, self.architecture)
+        # phases of the simulation, shared with the drive
+        self.timer = self.drive.timer
+        # simulation steps of the last evaluation, summed over all the cars
+        self.car_steps = 0
+        # when enabled, the trajectories of the last evaluation can be read with trajectory
+        self.recording = False
+        # function called with the drive after every tick, e.g. viewer.GenerationViewer
+        self.observer = None
+
+    def evaluate(self, model_vectors, max_ticks=None, deadline=None, time_budget=None):
+        """
+        :param model_vectors: flattened weights of every model
+        :param max_ticks: number of simulation steps of each run, None for no limit
+        :param deadline: time.monotonic() value after which every run ends, None for no limit
+        :param time_budget: seconds the runs may take from the start of the evaluation, None for no limit
+        :return: list with the number of passed checkpoints of every model
+        """
+        if time_budget is not None:
+            deadline = time.monotonic() + time_budget
+        network = PopulationNetwork(model_vectors, self.sizes, self.backend, self.architecture.activation)
+        drive = self.drive
+        drive.recording = self.recording
+        drive.restart(len(network))
+        actions = np.zeros((drive.size, 4), dtype=bool)
+        ticks = 0
+        self.car_steps = 0
+        while not drive.finished():
+            alive = drive.alive
+            self.car_steps += np.count_nonzero(alive)
+            with self.timer.phase("inference"):
+                actions[alive] = network.predict_actions(drive.get_states(alive), alive)
+            drive.step(actions)
+            ticks += 1
+            if self.observer is not None:
+                self.observer(drive)
+
+            if max_ticks is not None and ticks >= max_ticks:
+                break
+            if deadline is not None and time.monotonic() > deadline:
+                break
+
+        return drive.checkpoint_counter.tolist()
+
+    def trajectory(self, row):
+        return self.drive.trajectory(row)
+
+
+# evaluator of the track of a track worker process, created once when the worker starts
+_track_evaluator = None
+
+
+def _initialise_track_worker(track_files, car_image_path, car_scale, car_specification, backend, sensors,
+                             stall_rules, architecture):
+    global _track_evaluator
+    _, track_border_image_path, track_data_path = track_files
+    bundle = TrackBundle.load_or_compile(track_border_image_path, track_data_path)
+    _track_evaluator = BatchEvaluator(None, scale_image(pygame.image.load(car_image_path), car_scale),
+                                      car_specification, bundle.checkpoints, bundle.start_position,
+                                      bundle.start_angle, backend, bundle.distance_field, sensors, stall_rules,
+                                      architecture)
+
+
+def _evaluate_on_track(model_vectors, max_ticks, deadline, time_budget):
+    return _track_evaluator.evaluate(model_vectors, max_ticks, deadline, time_budget), _track_evaluator.car_steps
+
+
+class MultiTrackEvaluator:
+    """
+    Evaluates the population on several tracks at once, every track in its own worker process which maps the track
+    bundle once and simulates the whole population on it with BatchEvaluator. The fitness of a model is the aggregate
+    (mean or min) of its number of passed checkpoints on every track.
+    """
+
+    aggregates = {"mean": np.mean, "min": np.min}
+
+    def __init__(self, tracks_files, car_image_path, car_scale, car_specification: CarSpecification,
+                 aggregate="mean", backend="numpy", sensors: RaySensors = None, stall_rules: StallRules = None,
+                 architecture: Architecture = None):
+        """
+        :param tracks_files: track image, track border image and track data paths of every track,
+        see tracks.find_track_files
+        :param aggregate: "mean" or "min"
+        """
+        self.aggregate = self.aggregates[aggregate]
+        self.pools = [Pool(1, initializer=_initialise_track_worker,
+                           initargs=(track_files, car_image_path, car_scale, car_specification, backend, sensors,
+                                     stall_rules, architecture))
+                      for track_files in tracks_files]
+        # simulation steps of all the cars on all the tracks in the last evaluation
+        self.car_steps = 0
+
+    def evaluate(self, model_vectors, max_ticks=None, deadline=None, time_budget=None):
+        """
+        :param model_vectors: flattened weights of every model
+        :param max_ticks: number of simulation steps of each run, None for no limit
+        :param deadline: time.monotonic() value after which every run ends, None for no limit
+        :param time_budget: seconds the runs on every track may take from their start, None for no limit
+        :return: list with the aggregated number of passed checkpoints of every model
+        """
+        model_vectors = np.asarray(model_vectors)
+        results = [pool.apply_async(_evaluate_on_track, (model_vectors, max_ticks, deadline, time_budget))
+                   for pool in self.pools]
+        results = [result.get() for result in results]
+        self.car_steps = sum(car_steps for _, car_steps in results)
+        return self.aggregate(np.array([checkpoints for checkpoints, _ in results]), axis=0).tolist()
+
+    def close(self):
+        for pool in self.pools:
+            pool.close()
+            pool.join()
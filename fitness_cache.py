@@ -0,0 +1,49 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class FitnessCache:
+    """
+    Least recently used cache of the fitness of already evaluated genomes. The key is a hash of the weight vector
+    together with the identity of everything else the result depends on (the track, the car, the tick budget...),
+    so it can only be used when the simulation is deterministic.
+    """
+
+    def __init__(self, capacity=10000):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(model_vector, context):
+        """
+        :param model_vector: weight vector of the genome
+        :param context: bytes identifying everything else the fitness depends on
+        """
+        digest = hashlib.blake2b(context, digest_size=16)
+        digest.update(np.ascontiguousarray(model_vector).tobytes())
+        return digest.digest()
+
+    def get(self, key):
+        fitness = self.entries.get(key)
+        if fitness is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return fitness
+
+    def put(self, key, fitness):
+        self.entries[key] = fitness
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries)}
@@ -1,30 +1,38 @@
-import copy
+import glob
 import json
-import random
-import statistics
+import os
 from datetime import datetime
 from tkinter import Tk
 from tkinter.filedialog import askopenfilename
 
 import matplotlib.pyplot as plt
+import numpy as np
 
 import pygame
 import pygame_menu
-import torch
-from pygad.torchga import torchga
-from multiprocessing.pool import ThreadPool
-import numpy.random as npr
 
-from car import CarSpecification
+from car import CarAtlas, CAR_IMAGE_PATH, CAR_SCALE, default_car_specification
 from create import Create
 from drive import Drive
-from utilities import scale_image, get_human_player_input, create_action_tuple
+from evaluator import run_model
+from islands import IslandTrainer, spread_island_settings
+from metrics import MetricsWriter
+from model import compile_model, load_model, model_from_vector, predict_action, save_model
+from network import Architecture, ACTIVATIONS
+from replay import ReplayViewer
+from sensors import RaySensors
+from stall import default_stall_rules
+from trainer import Trainer
+from utilities import scale_image, get_human_player_input
+from viewer import GenerationViewer
 
 pygame.display.set_caption("Intelligent Racer 2D")
 
 FPS = 60
 WIDTH = 1600
 HEIGHT = 900
+FAST_FORWARD_RENDER_EVERY = 10
+FAST_FORWARD_MAX_TICKS = 100000
 
 
 def get_filename_dialog():
@@ -36,49 +44,30 @@ def set_label_text(label: pygame_menu.widgets.Label, text):
     label.set_title(text)
 
 
-def generate_generic_model(in_size, hidden_size, out_size):
-    input_layer = torch.nn.Linear(in_size, hidden_size)
-    relu_layer = torch.nn.ReLU()
-    output_layer = torch.nn.Linear(hidden_size, out_size)
-    return torch.nn.Sequential(input_layer, relu_layer, output_layer)
-
-
-def generate_game_model():
-    return generate_generic_model(8, 64, 4)  # todo consider adding 2nd/3rd checkpoint to state
-
-
 class Game:
     def __init__(self):
         pygame.init()
         self.window = pygame.display.set_mode((WIDTH, HEIGHT))
         self.clock = pygame.time.Clock()
-        self.car_image = scale_image(pygame.image.load("data/car.png"), 0.5)
+        self.car_image_path = CAR_IMAGE_PATH
+        self.car_image = scale_image(pygame.image.load(self.car_image_path), CAR_SCALE)
+        self.car_atlas = CarAtlas(self.car_image)
         self.track_image_path = "data/track3/track.png"
         self.track_image = pygame.image.load(self.track_image_path)  # default
         self.track_border_image_path = "data/track3/track_border.png"
         self.track_border_image = pygame.image.load(self.track_border_image_path)  # default
         self.track_data_path = "data/track3/track_data.json"
         self.checkpoints, self.start_position, self.start_angle = json.load(open(self.track_data_path))  # default
-
-        self.generation = 0
-        self.generation_stats = []  # (mean, median, best)
-        self.population_size = 50
-        self.crossover_chance = 0.8
-        self.mutation_chance = 0.03
-        self.mutation_percent_genes = 0.005
-        self.generation_time = 2000
-        self.finish_time = pygame.time.get_ticks()
-
-        self.population = None
-        self.create_new_population()
-
-        self.car_specification = CarSpecification(
-            acceleration=0.2,
-            deceleration=0.2,
-            brake_power=0.5,
-            max_speed=10,
-            max_angle=4
-        )
+        self.car_specification = default_car_specification()
+        self.trainer = Trainer(self.track_image_path, self.track_border_image_path, self.track_data_path,
+                               self.car_specification, self.car_image)
+        self.watching_training = False
+        self.watch_fps = 30
+        # players are drawn every show_every-th tick, 1 in real time, 0 for only printing the summary of the run
+        self.show_every = 1
+        # with more than one island the populations evolve in their own processes, see islands.py
+        self.islands = 1
+        self.island_trainer = None
 
         self.main_menu = self._main_menu()
 
@@ -104,18 +93,57 @@ class Game:
             theme=pygame_menu.themes.THEME_BLUE,
 
         )
-        train_menu.add.range_slider("Population size", self.population_size, [i for i in range(10, 501, 2)],
+        train_menu.add.range_slider("Population size", self.trainer.population_size, [i for i in range(10, 501, 2)],
                                     onchange=self.change_generation_size, range_text_value_enabled=False)
-        train_menu.add.range_slider("Crossover chance", self.crossover_chance, (0, 1), increment=0.01,
+        train_menu.add.range_slider("Crossover chance", self.trainer.crossover_chance, (0, 1), increment=0.01,
                                     onchange=self.change_crossover_chance)
-        train_menu.add.range_slider("Mutation chance", self.mutation_chance, (0, 0.25), increment=0.01,
+        train_menu.add.range_slider("Mutation chance", self.trainer.mutation_chance, (0, 0.25), increment=0.01,
                                     onchange=self.change_mutation_chance)
-        train_menu.add.range_slider("Average percent of genes to mutate", self.mutation_percent_genes, (0, 0.25),
-                                    increment=0.01, onchange=self.change_mutation_percent_genes)
+        train_menu.add.range_slider("Average percent of genes to mutate", self.trainer.mutation_percent_genes,
+                                    (0, 0.25), increment=0.01, onchange=self.change_mutation_percent_genes)
+        train_menu.add.selector("Limit each generation by", [("Ticks", True), ("Time", False)],
+                                onchange=self.change_use_tick_budget)
+        train_menu.add.range_slider("Ticks for each generation", self.trainer.generation_ticks,
+                                    [i for i in range(100, 5001, 100)],
+                                    onchange=self.change_generation_ticks, range_text_value_enabled=False)
         train_menu.add.range_slider("Time for each generation [s]", 2, [i for i in range(0, 31)],
                                     onchange=self.change_generation_time, range_text_value_enabled=False)
-
-        generation_label = train_menu.add.label(f"Generation: {self.generation}")
+        train_menu.add.range_slider("Ray sensors (creates new population)", self.trainer.sensor_count,
+                                    [i for i in range(0, 17)], onchange=self.change_sensor_count,
+                                    range_text_value_enabled=False)
+        train_menu.add.text_input("Hidden layer sizes (creates new population): ",
+                                  default=",".join(map(str, self.trainer.architecture.hidden_sizes)),
+                                  onreturn=self.change_hidden_sizes)
+        train_menu.add.selector("Activation (creates new population)",
+                                [(activation, activation) for activation in ACTIVATIONS],
+                                onchange=self.change_activation)
+        train_menu.add.selector("Fitness on", [("Loaded track", False), ("All tracks in data/", True)],
+                                onchange=self.change_fitness_on_all_tracks)
+        train_menu.add.selector("Fitness over tracks", [("Mean", "mean"), ("Min", "min")],
+                                onchange=self.change_fitness_aggregate)
+        train_menu.add.selector("Retire stalled cars", [("Yes", True), ("No", False)],
+                                onchange=self.change_retire_stalled_cars)
+        train_menu.add.selector("Evaluation engine", [("Batch", "batch"), ("Processes", "processes")],
+                                onchange=self.change_engine)
+        train_menu.add.range_slider("Worker processes", self.trainer.workers,
+                                    [i for i in range(1, os.cpu_count() + 1)], onchange=self.change_workers,
+                                    range_text_value_enabled=False)
+        train_menu.add.selector("Record replays of the best players", [("No", False), ("Yes", True)],
+                                onchange=self.change_record_replays)
+        train_menu.add.selector("Stream generation metrics to metrics/",
+                                [("No", None), ("JSON lines", "jsonl"), ("CSV", "csv")],
+                                onchange=self.change_metrics_format)
+        train_menu.add.selector("Watch the training (batch engine)", [("No", False), ("Yes", True)],
+                                onchange=self.change_watch_training)
+        train_menu.add.range_slider("Frames per second while watching", self.watch_fps, [i for i in range(5, 61, 5)],
+                                    onchange=self.change_watch_fps, range_text_value_enabled=False)
+        train_menu.add.range_slider("Islands (creates new population)", self.islands,
+                                    [i for i in range(1, os.cpu_count() + 1)], onchange=self.change_islands,
+                                    range_text_value_enabled=False)
+        train_menu.add.text_input("Seed (empty for random): ", default="", input_type=pygame_menu.locals.INPUT_INT,
+                                  onchange=self.change_seed)
+
+        generation_label = train_menu.add.label(f"Generation: {self.trainer.generation}")
         mean_label = train_menu.add.label(f"Mean checkpoints: 0")
         median_label = train_menu.add.label(f"Median checkpoints: 0")
         best_label = train_menu.add.label(f"Best checkpoints: 0")
@@ -130,8 +158,14 @@ class Game:
         train_menu.add.button("Train 100 generations",
                               lambda: self.train_generations(100, generation_label, mean_label, median_label,
                                                              best_label))
-        train_menu.add.button("Show best player", lambda: self.show_player(self.get_best_player_from_population()[0]))
+        train_menu.add.selector("Show players", [("In real time", 1), ("Fast forward", FAST_FORWARD_RENDER_EVERY),
+                                                 ("Only the summary", 0)], onchange=self.change_show_every)
+        train_menu.add.button("Show best player", lambda: self.show_player(compile_model(self.get_best_model())))
+        train_menu.add.button("Watch replays of the last 3 generations", lambda: self.show_replays(3))
         train_menu.add.button("Save best player model", lambda: self.save_best_player())
+        train_menu.add.button("Save training checkpoint", lambda: self.save_training_checkpoint())
+        train_menu.add.button("Resume training from checkpoint",
+                              lambda: self.load_training_checkpoint(generation_label))
         train_menu.add.button("Load model and play it", lambda: self.load_and_show_model())
         train_menu.add.button("Plot training results", lambda: self.plot_generation_stats())
 
@@ -177,8 +211,10 @@ class Game:
         self.main_menu.disable()
         self.window = pygame.display.set_mode((self.track_image.get_width(), self.track_image.get_height()))
         running = True
+        # the same collisions as the trained cars, looked up in the distance field of the track
         drive = Drive(self.window, self.track_image, self.track_border_image, self.car_image, self.car_specification,
-                      self.checkpoints, self.start_position, self.start_angle)
+                      self.checkpoints, self.start_position, self.start_angle, self.car_atlas,
+                      track_distance_field=self.trainer.track_distance_field)
         while running:
             self.clock.tick(FPS)
             action = get_human_player_input()
@@ -193,209 +229,235 @@ class Game:
 
         self.main_menu.enable()
 
-    def show_player(self, model):
+    def show_player(self, model, sensor_count=None):
+        """
+        Runs the model on the loaded track, in real time, fast forward (drawing every show_every-th tick at full
+        speed) or headless (only printing the summary), see change_show_every.
+        :param sensor_count: ray sensors of the model, None for the ones of the trainer
+        :return: RunSummary of the run
+        """
         self.main_menu.disable()
-        self.window = pygame.display.set_mode((self.track_image.get_width(), self.track_image.get_height()))
-
-        drive = Drive(self.window, self.track_image, self.track_border_image, self.car_image, self.car_specification,
-                      self.checkpoints, self.start_position, self.start_angle)
-        while True:
-            state = torch.tensor(drive.get_state(), dtype=torch.float)
-            prediction = model(state)
-            action = create_action_tuple()
-            if prediction[0] >= 0:
-                action.throttle = 1
-            else:
-                action.throttle = 0
-            if prediction[1] >= 0:
-                action.brake = 1
-            else:
-                action.brake = 0
-            if prediction[2] >= 0:
-                action.left = 1
-            else:
-                action.left = 0
-            if prediction[3] >= 0:
-                action.right = 1
-            else:
-                action.right = 0
-
-            drive.draw()
-            self.clock.tick(FPS)
-            stop = drive.handle_events()
-            game_over = drive.step(action)
-
-            if game_over or stop:
-                break
+        if self.show_every:
+            self.window = pygame.display.set_mode((self.track_image.get_width(), self.track_image.get_height()))
+
+        real_time = self.show_every == 1
+        drive = Drive(self.window if self.show_every else None, self.track_image, self.track_border_image,
+                      self.car_image, self.car_specification, self.checkpoints, self.start_position, self.start_angle,
+                      self.car_atlas, track_distance_field=self.trainer.track_distance_field,
+                      sensors=self.trainer.get_sensors() if sensor_count is None else
+                      RaySensors(sensor_count) if sensor_count > 0 else None,
+                      # without watching, runs which go nowhere have to end by themselves
+                      stall_rules=None if real_time else self.trainer.stall_rules)
+        summary = run_model(drive, lambda state: predict_action(model, state),
+                            max_ticks=None if real_time else FAST_FORWARD_MAX_TICKS, render_every=self.show_every,
+                            clock=self.clock if real_time else None, fps=FPS)
 
         print(f"Number of checkpoints: {drive.checkpoint_counter}")
+        print(summary)
+
+        self.window = pygame.display.set_mode((WIDTH, HEIGHT))
+        self.main_menu.enable()
+        return summary
 
+    def show_replays(self, count):
+        if not self.trainer.replays:
+            print("No recorded replays, enable recording and train a generation first")
+            return
+        self.main_menu.disable()
+        self.window = pygame.display.set_mode((self.track_image.get_width(), self.track_image.get_height()))
+        ReplayViewer(self.window, self.track_image, self.car_image, self.trainer.replays[-count:]).run(self.clock)
         self.window = pygame.display.set_mode((WIDTH, HEIGHT))
         self.main_menu.enable()
-        return drive.checkpoint_counter
 
-    def get_best_player_from_population(self):
-        maxi, index = -1, -1
-        for i in range(len(self.population)):
-            if self.population[i][1] > maxi:
-                maxi = self.population[i][1]
-                index = i
-        return self.population[index]
+    def get_best_model(self):
+        return model_from_vector(self.trainer.get_best_vector(), self.trainer.sensor_count, self.trainer.architecture)
 
     def train_generations(self, number_of_generations, generations_label, mean_label, median_label, best_label):
+        if self.islands > 1:
+            self.train_island_generations(number_of_generations, generations_label, mean_label, median_label,
+                                          best_label)
+            return
+        viewer = None
+        if self.watching_training and not self.trainer.uses_batch_evaluator():
+            print("Only the batch engine on the loaded track can be watched, the training continues without drawing")
+        elif self.watching_training:
+            self.window = pygame.display.set_mode((self.track_image.get_width(), self.track_image.get_height()))
+            viewer = GenerationViewer(self.window, self.track_image, self.car_image, self.watch_fps)
+            self.trainer.evaluation_observer = viewer
         for _ in range(number_of_generations):
-            self.finish_time = pygame.time.get_ticks() + self.generation_time
-            with ThreadPool() as pool:
-                # run every AI parallel
-                pool.map(self.train_ai, [i for i in range(len(self.population))])
-
-            new_population = []
-            best_player = self.get_best_player_from_population()
-            # add the best into the population, twice
-            new_population.extend([best_player, best_player])
-
-            parents = self.select_parents()
-            for i in range(0, len(parents) - 2, 2):
-                parent1, parent2 = parents[i], parents[i + 1]
-                child1, child2 = self.crossover_model_vectors(parent1, parent2)
-                self.mutate_model(child1)
-                self.mutate_model(child2)
-                child1_model = generate_game_model()
-                child2_model = generate_game_model()
-                child1_model.load_state_dict(torchga.model_weights_as_dict(child1_model, child1))
-                child2_model.load_state_dict(torchga.model_weights_as_dict(child2_model, child2))
-                new_population.extend([(child1_model, -1), (child2_model, -1)])
-
-            self.generation += 1
-            generation_string = f"Generation: {self.generation}"
+            if viewer is not None:
+                viewer.generation = self.trainer.generation + 1
+            mean, median, best = self.trainer.train_generation()
+
+            generation_string = f"Generation: {self.trainer.generation}"
             print(generation_string)
             set_label_text(generations_label, generation_string)
 
-            results = [x[1] for x in self.population]
-            mean = statistics.mean(results)
             mean_string = f"Mean checkpoints: {mean}"
             print(mean_string)
             set_label_text(mean_label, mean_string)
 
-            median = statistics.median(results)
             median_string = f"Median checkpoints: {median}"
             print(median_string)
             set_label_text(median_label, median_string)
 
-            best = max(results)
             best_string = f"Best checkpoints: {best}"
             print(best_string)
             set_label_text(best_label, best_string)
             print()
 
-            self.generation_stats.append((mean, median, best))
-
-            self.population = new_population
+        if viewer is not None:
+            self.trainer.evaluation_observer = None
+            self.window = pygame.display.set_mode((WIDTH, HEIGHT))
+
+    def train_island_generations(self, number_of_generations, generations_label, mean_label, median_label,
+                                 best_label):
+        trainer = self.trainer
+        if self.island_trainer is None:
+            # the islands start with the current settings of the training menu
+            self.island_trainer = IslandTrainer(
+                (trainer.track_image_path, trainer.track_border_image_path, trainer.track_data_path),
+                spread_island_settings(self.islands, trainer.crossover_chance, trainer.mutation_chance),
+                population_size=trainer.population_size, seed=trainer.seed,
+                mutation_percent_genes=trainer.mutation_percent_genes, generation_ticks=trainer.generation_ticks,
+                sensor_count=trainer.sensor_count, fitness_track_directories=trainer.fitness_track_directories,
+                fitness_aggregate=trainer.fitness_aggregate, stall_rules=trainer.stall_rules,
+                backend=trainer.backend, architecture=trainer.architecture,
+                metrics_path=trainer.metrics_writer.path if trainer.metrics_writer is not None else None,
+                engine=trainer.engine, workers=trainer.workers, use_fitness_cache=trainer.use_fitness_cache)
+        if trainer.record_replays or self.watching_training:
+            print("The islands train in their own processes, they are neither recorded nor watched")
+        stats = self.island_trainer.train(number_of_generations)
+        for generation in range(number_of_generations):
+            print(f"Generation: {trainer.generation + generation + 1}, best checkpoints of every island: "
+                  f"{[island_stats[generation][2] for island_stats in stats]}")
+
+        # the population of the best island becomes the population of the trainer, to show and save its best player
+        trainer.population, trainer.generation_stats = self.island_trainer.get_population(
+            self.island_trainer.best_island())
+        trainer.generation = self.island_trainer.generation
+        trainer.fitness = np.full(len(trainer.population), -1)
+        mean, median, best = trainer.generation_stats[-1]
+        set_label_text(generations_label, f"Generation: {trainer.generation}")
+        set_label_text(mean_label, f"Mean checkpoints: {mean}")
+        set_label_text(median_label, f"Median checkpoints: {median}")
+        set_label_text(best_label, f"Best checkpoints: {best}")
 
     def create_new_population(self):
-        self.population = [(generate_game_model(), -1) for _ in range(self.population_size)]
-        self.generation = 0
-        self.generation_stats = []
-
-    def train_ai(self, index):
-        drive = Drive(self.window, self.track_image, self.track_border_image, self.car_image, self.car_specification,
-                      self.checkpoints, self.start_position, self.start_angle)
-        model = self.population[index][0]
-        while True:
-            state = torch.tensor(drive.get_state(), dtype=torch.float)
-            prediction = model(state)
-            action = create_action_tuple()
-            if prediction[0] >= 0:
-                action.throttle = 1
-            else:
-                action.throttle = 0
-            if prediction[1] >= 0:
-                action.brake = 1
-            else:
-                action.brake = 0
-            if prediction[2] >= 0:
-                action.left = 1
-            else:
-                action.left = 0
-            if prediction[3] >= 0:
-                action.right = 1
-            else:
-                action.right = 0
+        self.close_island_trainer()
+        self.trainer.create_new_population()
 
-            game_over = drive.step(action)
-
-            if pygame.time.get_ticks() > self.finish_time:
-                game_over = True
+    def close_island_trainer(self):
+        if self.island_trainer is not None:
+            self.island_trainer.close()
+            self.island_trainer = None
 
-            if game_over:
-                break
-
-        self.population[index] = (model, drive.checkpoint_counter)
-
-    def select_parents(self):
-        parents = []
-        # add the best into the parents
-        best_from_population = self.get_best_player_from_population()
-        parents.append(torchga.model_weights_as_vector(best_from_population[0]))
-
-        # https://stackoverflow.com/a/52243810
-        maxi = sum([x[1] for x in self.population])
-        if maxi == 0:
-            # if every solution is 'bad' then every solution has equal probability
-            maxi = len(self.population)
-            selection_probabilities = [1 / maxi for _ in self.population]
-        else:
-            selection_probabilities = [x[1] / maxi for x in self.population]
-
-        for _ in range(self.population_size - 1):
-            parents.append(torchga.model_weights_as_vector(
-                self.population[npr.choice(len(self.population), p=selection_probabilities)][0]))
-
-        return parents
-
-    def crossover_model_vectors(self, model_vector1, model_vector2):
-        if random.random() > self.crossover_chance:
-            return model_vector1, model_vector2
-        len_model = len(model_vector1)
-        child_vector1 = copy.deepcopy(model_vector1)
-        child_vector2 = copy.deepcopy(model_vector2)
-        crossover_point1 = random.randint(0, len_model)
-        crossover_point2 = random.randint(crossover_point1, len_model)
-        for i in range(crossover_point1, crossover_point2):
-            child_vector1[i] = model_vector2[i]
-            child_vector2[i] = model_vector1[i]
-        return child_vector1, child_vector2
-
-    def mutate_model(self, model_vector):
-        if random.random() < self.mutation_chance:
-            for i in range(len(model_vector)):
-                if random.random() < self.mutation_percent_genes:
-                    model_vector[i] = random.random() - 0.5  # between -0.5 and 0.5
+    def change_islands(self, islands):
+        self.islands = int(islands)
+        self.create_new_population()
 
     def change_generation_size(self, size):
-        self.population_size = size
+        self.trainer.population_size = size
 
     def change_crossover_chance(self, chance):
-        self.crossover_chance = chance
+        self.trainer.crossover_chance = chance
 
     def change_mutation_chance(self, chance):
-        self.mutation_chance = chance
+        self.trainer.mutation_chance = chance
 
     def change_generation_time(self, time):
-        self.generation_time = time * 1000
+        self.trainer.generation_time = time * 1000
+
+    def change_use_tick_budget(self, _, use_tick_budget):
+        self.trainer.use_tick_budget = use_tick_budget
+
+    def change_generation_ticks(self, ticks):
+        self.trainer.generation_ticks = ticks
+
+    def change_sensor_count(self, count):
+        # the input size of the network changes, so the current population can't be used anymore
+        self.trainer.sensor_count = int(count)
+        self.trainer.close_evaluator()
+        self.create_new_population()
+
+    def change_hidden_sizes(self, hidden_sizes):
+        try:
+            architecture = Architecture.parse(hidden_sizes, self.trainer.architecture.activation)
+        except ValueError as e:
+            print(e)
+            return
+        self.change_architecture(architecture)
+
+    def change_activation(self, _, activation):
+        self.change_architecture(Architecture(self.trainer.architecture.hidden_sizes, activation))
+
+    def change_architecture(self, architecture):
+        # the weight vectors have another layout, so the current population can't be used anymore
+        if architecture == self.trainer.architecture:
+            return
+        self.trainer.architecture = architecture
+        self.trainer.close_evaluator()
+        self.create_new_population()
+
+    def change_fitness_on_all_tracks(self, _, all_tracks):
+        self.trainer.fitness_track_directories = sorted(glob.glob("data/track*")) if all_tracks else None
+        self.trainer.close_evaluator()
+
+    def change_fitness_aggregate(self, _, aggregate):
+        self.trainer.fitness_aggregate = aggregate
+        self.trainer.close_evaluator()
+
+    def change_retire_stalled_cars(self, _, retire):
+        self.trainer.stall_rules = default_stall_rules() if retire else None
+        self.trainer.close_evaluator()
+
+    def change_engine(self, _, engine):
+        self.trainer.engine = engine
+        self.trainer.close_evaluator()
+
+    def change_workers(self, workers):
+        self.trainer.workers = workers
+        self.trainer.close_evaluator()
+
+    def change_show_every(self, _, show_every):
+        self.show_every = show_every
+
+    def change_watch_training(self, _, watching):
+        self.watching_training = watching
+
+    def change_watch_fps(self, fps):
+        self.watch_fps = int(fps)
+
+    def change_record_replays(self, _, record):
+        self.trainer.record_replays = record
+
+    def change_metrics_format(self, _, file_format):
+        self.close_metrics_writer()
+        if file_format is not None:
+            path = f"metrics/metrics-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}.{file_format}"
+            self.trainer.metrics_writer = MetricsWriter(path)
+            print(f"Streaming the metrics of every generation to {path}")
+
+    def close_metrics_writer(self):
+        if self.trainer.metrics_writer is not None:
+            self.trainer.metrics_writer.close()
+            self.trainer.metrics_writer = None
+
+    def change_seed(self, seed):
+        self.trainer.seed = int(seed) if str(seed) != "" else None
 
     def change_mutation_percent_genes(self, percent):
-        self.mutation_percent_genes = percent
+        self.trainer.mutation_percent_genes = percent
 
     def plot_generation_stats(self):
-        x_data = [i for i in range(1, self.generation + 1)]
+        x_data = [i for i in range(1, self.trainer.generation + 1)]
         fig = plt.figure()
         fig.suptitle("Training results")
         plt.xlabel(f"Generation")
         plt.ylabel("Number of checkpoints")
-        plt.plot(x_data, [x[0] for x in self.generation_stats], label='Mean')
-        plt.plot(x_data, [x[1] for x in self.generation_stats], label='Median')
-        plt.plot(x_data, [x[2] for x in self.generation_stats], label='Best')
+        plt.plot(x_data, [x[0] for x in self.trainer.generation_stats], label='Mean')
+        plt.plot(x_data, [x[1] for x in self.trainer.generation_stats], label='Median')
+        plt.plot(x_data, [x[2] for x in self.trainer.generation_stats], label='Best')
         plt.legend()
         fig.waitforbuttonpress()
 
@@ -444,25 +506,50 @@ class Game:
             self.track_border_image = pygame.image.load(self.track_border_image_path)
             with open(self.track_data_path, 'r') as file:
                 self.checkpoints, self.start_position, self.start_angle = json.load(file)
+            self.trainer.load_track(self.track_image_path, self.track_border_image_path, self.track_data_path)
         except Exception as e:
             print(e)
 
     def save_best_player(self):
-        best = self.get_best_player_from_population()[0]
+        best = self.get_best_model()
         filepath = f"models/model-{datetime.now().strftime('%Y-%m-%d-%H-%M-%S')}"
-        torch.save(best.state_dict(), filepath)
+        save_model(best, filepath, self.trainer.sensor_count, self.trainer.architecture)
+
+    def save_training_checkpoint(self):
+        os.makedirs("checkpoints", exist_ok=True)
+        # written in the background, the game doesn't wait for the disk
+        self.trainer.save_checkpoint(f"checkpoints/generation-{self.trainer.generation}.npz", background=True)
+
+    def load_training_checkpoint(self, generation_label):
+        if self.islands > 1:
+            print("A checkpoint is resumed as a single population, set the islands to 1 first")
+            return
+        checkpoint_path = get_filename_dialog()
+        try:
+            self.trainer.load_checkpoint(checkpoint_path)
+            set_label_text(generation_label, f"Generation: {self.trainer.generation}")
+            # the checkpoint continues on its own track, which is then shown too
+            trainer_track = (self.trainer.track_image_path, self.trainer.track_border_image_path,
+                             self.trainer.track_data_path)
+            if trainer_track != (self.track_image_path, self.track_border_image_path, self.track_data_path):
+                self.track_image_path, self.track_border_image_path, self.track_data_path = trainer_track
+                self.load_assets()
+        except Exception as e:
+            print(e)
 
     def load_and_show_model(self):
         model_path = get_filename_dialog()
         try:
-            model = generate_game_model()
-            model.load_state_dict(torch.load(model_path))
-            model.eval()
-            self.show_player(model)
+            # the saved model knows its own sensors and layers, they don't have to match the training settings
+            model, sensor_count, _ = load_model(model_path)
+            self.show_player(compile_model(model), sensor_count)
         except Exception as e:
             print(e)
 
     def quit(self):
+        self.close_island_trainer()
+        self.close_metrics_writer()
+        self.trainer.close()
         self.main_menu.disable()
 
     def main(self):
@@ -0,0 +1,90 @@
+import numpy as np
+import numpy.random as npr
+
+from network import GAME_MODEL_SIZES, vector_size
+from timing import PhaseTimer
+
+# copies of the best individual at the top of every new generation, see next_generation
+ELITE_COPIES = 2
+
+
+def random_population(population_size, sizes=GAME_MODEL_SIZES):
+    """
+    Creates a population of weight vectors initialised the same way as the layers of torch.nn.Linear,
+    uniformly between -1/sqrt(in_size) and 1/sqrt(in_size).
+    :return: array of shape (population_size, genes)
+    """
+    bounds = []
+    for in_size, out_size in zip(sizes, sizes[1:]):
+        bounds.append(np.full(in_size * out_size + out_size, 1 / np.sqrt(in_size)))
+    bounds = np.concatenate(bounds)
+    return npr.uniform(-bounds, bounds, (population_size, vector_size(sizes))).astype(np.float32)
+
+
+def select_parents(population, fitness, count):
+    """
+    The best individual followed by count - 1 individuals chosen with probability proportional to their fitness.
+    :return: array of shape (count, genes)
+    """
+    total = fitness.sum()
+    if total == 0:
+        # if every solution is 'bad' then every solution has equal probability
+        selection_probabilities = None
+    else:
+        selection_probabilities = fitness / total
+    chosen = npr.choice(len(population), size=count - 1, p=selection_probabilities)
+    return population[np.concatenate(([np.argmax(fitness)], chosen))]
+
+
+def crossover(parents1, parents2, crossover_chance):
+    """
+    Two-point crossover of every pair of parents, each pair is crossed over with the probability crossover_chance,
+    otherwise the children are copies of the parents.
+    :return: two arrays with the children
+    """
+    pairs, genes = parents1.shape
+    crossover_point1 = npr.randint(0, genes + 1, pairs)
+    crossover_point2 = npr.randint(crossover_point1, genes + 1)
+    crossing = npr.random(pairs) < crossover_chance
+    columns = np.arange(genes)
+    swapped = ((columns >= crossover_point1[:, np.newaxis]) & (columns < crossover_point2[:, np.newaxis])
+               & crossing[:, np.newaxis])
+    return np.where(swapped, parents2, parents1), np.where(swapped, parents1, parents2)
+
+
+def mutate(population, mutation_chance, mutation_percent_genes):
+    """
+    Every individual is mutated with the probability mutation_chance, a mutated individual has each of its genes
+    replaced with the probability mutation_percent_genes by a random value between -0.5 and 0.5. Works in place.
+    """
+    mutating = npr.random(len(population)) < mutation_chance
+    genes = (npr.random(population.shape) < mutation_percent_genes) & mutating[:, np.newaxis]
+    population[genes] = npr.random(np.count_nonzero(genes)) - 0.5
+
+
+def next_generation(population, fitness, crossover_chance, mutation_chance, mutation_percent_genes,
+                    timer: PhaseTimer = None):
+    """
+    :param population: array of shape (population_size, genes), one weight vector per individual
+    :param fitness: array with the fitness of every individual
+    :param timer: optional timer of the selection, crossover and mutation phases
+    :return: array with the new population of the same shape
+    """
+    if timer is None:
+        timer = PhaseTimer()
+    population_size = len(population)
+    best = population[np.argmax(fitness)]
+
+    with timer.phase("selection"):
+        parents = select_parents(population, fitness, population_size)
+    # pairs of consecutive parents, the best individual is added twice instead of the last pair
+    pairs = (population_size - 1) // 2
+    with timer.phase("crossover"):
+        children1, children2 = crossover(parents[0:2 * pairs:2], parents[1:2 * pairs:2], crossover_chance)
+        children = np.empty((2 * pairs, population.shape[1]), dtype=population.dtype)
+        children[0::2], children[1::2] = children1, children2
+    with timer.phase("mutation"):
+        mutate(children, mutation_chance, mutation_percent_genes)
+
+    # add the best into the population, twice
+    return np.concatenate((best[np.newaxis], best[np.newaxis], children))
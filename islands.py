@@ -0,0 +1,201 @@
+"""
+Island model of the genetic algorithm: several populations evolve in their own processes, each with its own crossover
+and mutation chance, and every few generations the best individuals of every island migrate to the next island of a
+ring. The migrants are flat weight vectors exchanged through one block of shared memory, only the small commands and
+statistics go through the pipes.
+"""
+import os
+from multiprocessing import Pipe, Process
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from genetic import ELITE_COPIES
+from metrics import MetricsWriter, island_metrics_path
+from network import Architecture, game_model_sizes, vector_size
+from stall import StallRules
+from trainer import Trainer
+
+# seconds an island has to finish after the close command before it is terminated
+CLOSE_TIMEOUT = 30
+
+
+class IslandSettings:
+    def __init__(self, crossover_chance, mutation_chance):
+        self.crossover_chance = crossover_chance
+        self.mutation_chance = mutation_chance
+
+
+def spread_island_settings(count, crossover_chance, mutation_chance):
+    """
+    Settings of count islands around the given chances, from conservative (less crossover, half the mutation chance)
+    to explorative (more crossover, twice the mutation chance).
+    """
+    if count == 1:
+        return [IslandSettings(crossover_chance, mutation_chance)]
+    crossover_chances = np.clip(np.linspace(crossover_chance - 0.2, crossover_chance + 0.2, count), 0, 1)
+    mutation_chances = np.clip(mutation_chance * np.logspace(-1, 1, count, base=2), 0, 1)
+    return [IslandSettings(float(crossover), float(mutation))
+            for crossover, mutation in zip(crossover_chances, mutation_chances)]
+
+
+def _island_worker(connection, shared_memory_name, shape, index, track_files, settings: IslandSettings, options,
+                   metrics_path):
+    shared_memory = SharedMemory(shared_memory_name)
+    migrants = np.ndarray(shape, dtype=np.float32, buffer=shared_memory.buf)
+    trainer = Trainer(*track_files)
+    for name, value in options.items():
+        setattr(trainer, name, value)
+    trainer.crossover_chance = settings.crossover_chance
+    trainer.mutation_chance = settings.mutation_chance
+    if trainer.seed is not None:
+        # every island has its own random sequence, but the whole run stays reproducible
+        trainer.seed += index
+    if metrics_path is not None:
+        trainer.metrics_writer = MetricsWriter(island_metrics_path(metrics_path, index))
+    trainer.create_new_population()
+    try:
+        while True:
+            command, argument = connection.recv()
+            if command == "train":
+                stats = [trainer.train_generation() for _ in range(argument)]
+                migrants[index] = trainer.get_top_vectors(shape[1])
+                connection.send(stats)
+            elif command == "immigrate":
+                trainer.replace_vectors(migrants[argument])
+                connection.send(None)
+            elif command == "checkpoint":
+                trainer.save_checkpoint(argument)
+                connection.send(None)
+            elif command == "population":
+                connection.send((trainer.population, trainer.generation_stats))
+            elif command == "close":
+                break
+    finally:
+        trainer.close()
+        if trainer.metrics_writer is not None:
+            trainer.metrics_writer.close()
+        # the coordinator owns the shared memory, the worker only detaches from it
+        del migrants
+        shared_memory.close()
+
+
+def check_migrants(migrants, population_size):
+    """
+    Raises ValueError unless the migrants fit into the children of a population, the copies of its best individual
+    are never replaced.
+    """
+    if not 1 <= migrants <= population_size - ELITE_COPIES:
+        raise ValueError(f"the number of migrants has to be between 1 and {population_size - ELITE_COPIES} (the "
+                         f"population size minus the {ELITE_COPIES} copies of its best individual), not {migrants}")
+
+
+class IslandTrainer:
+    """
+    Coordinates the islands: runs migration_interval generations on every island at once, then lets the top migrants
+    of island i replace children of island i + 1. Migration is synchronous, so runs with a seed are reproducible.
+    The islands aren't daemon processes, so their trainers can start worker pools of their own (the processes engine
+    and the fitness on several tracks), which means close has to be called to end them.
+    """
+
+    def __init__(self, track_files, islands, population_size=50, migration_interval=5, migrants=2, seed=None,
+                 mutation_percent_genes=0.005, generation_ticks=600, sensor_count=0, fitness_track_directories=None,
+                 fitness_aggregate="mean", stall_rules: StallRules = None, backend="numpy",
+                 architecture: Architecture = None, metrics_path=None, engine="batch", workers=None,
+                 use_fitness_cache=True):
+        """
+        :param track_files: track image, track border image and track data path, see tracks.find_track_files
+        :param islands: IslandSettings of every island, see spread_island_settings
+        :param migrants: number of individuals every island sends to the next one
+        :param metrics_path: metrics file, every island streams its metrics into its own copy of it, see
+        metrics.island_metrics_path
+        :param engine: evaluation engine of every island, see Trainer.engine
+        :param workers: worker processes of every island with the processes engine, None for the default of Trainer
+        """
+        check_migrants(migrants, population_size)
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.generation = 0
+        self.generation_stats = [[] for _ in islands]  # (mean, median, best) of every generation of every island
+        shape = (len(islands), migrants, vector_size(game_model_sizes(sensor_count, architecture)))
+        self.shared_memory = SharedMemory(create=True, size=int(np.prod(shape)) * np.dtype(np.float32).itemsize)
+        options = dict(population_size=population_size, mutation_percent_genes=mutation_percent_genes,
+                       generation_ticks=generation_ticks, seed=seed, sensor_count=sensor_count,
+                       fitness_track_directories=fitness_track_directories, fitness_aggregate=fitness_aggregate,
+                       stall_rules=stall_rules, backend=backend, architecture=architecture or Architecture(),
+                       engine=engine, use_fitness_cache=use_fitness_cache, use_tick_budget=True)
+        if workers is not None:
+            options["workers"] = workers
+        self.connections = []
+        self.processes = []
+        for index, settings in enumerate(islands):
+            connection, worker_connection = Pipe()
+            process = Process(target=_island_worker,
+                              args=(worker_connection, self.shared_memory.name, shape, index, track_files, settings,
+                                    options, metrics_path))
+            process.start()
+            self.connections.append(connection)
+            self.processes.append(process)
+
+    def _all(self, command, arguments):
+        for connection, argument in zip(self.connections, arguments):
+            connection.send((command, argument))
+        return [connection.recv() for connection in self.connections]
+
+    def train(self, generations):
+        """
+        Trains every island for the number of generations, migrating every migration_interval generations.
+        :return: (mean, median, best) of every generation of every island, a list per island
+        """
+        stats = [[] for _ in self.islands]
+        while generations > 0:
+            # epochs end on the multiples of migration_interval, also when a previous call stopped in between them
+            epoch = min(generations, self.migration_interval - self.generation % self.migration_interval)
+            for island_stats, new_stats in zip(stats, self._all("train", [epoch] * len(self.islands))):
+                island_stats.extend(new_stats)
+            self.generation += epoch
+            generations -= epoch
+            if self.generation % self.migration_interval == 0 and len(self.islands) > 1:
+                count = len(self.islands)
+                self._all("immigrate", [(index - 1) % count for index in range(count)])
+        for island_stats, new_stats in zip(self.generation_stats, stats):
+            island_stats.extend(new_stats)
+        return stats
+
+    def best_island(self):
+        # the island whose last generation had the best individual
+        return int(np.argmax([island_stats[-1][2] if island_stats else -1 for island_stats in self.generation_stats]))
+
+    def get_population(self, island):
+        """
+        :return: population and generation statistics of the island
+        """
+        self.connections[island].send(("population", None))
+        return self.connections[island].recv()
+
+    def save_checkpoints(self, directory):
+        """
+        Saves a checkpoint of every island, each can be resumed on its own like a checkpoint of Trainer.
+        """
+        self._all("checkpoint", [os.path.join(directory, f"island-{index}-generation-{self.generation}.npz")
+                                 for index in range(len(self.islands))])
+
+    def close(self):
+        try:
+            for connection in self.connections:
+                try:
+                    connection.send(("close", None))
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # the island already died
+            for process in self.processes:
+                process.join(CLOSE_TIMEOUT)
+                if process.is_alive():
+                    process.terminate()
+                    process.join()
+        finally:
+            for connection in self.connections:
+                connection.close()
+            # the shared memory outlives the coordinator unless it is unlinked, also when an island failed
+            self.shared_memory.close()
+            self.shared_memory.unlink()
@@ -0,0 +1,158 @@
+"""
+Ranks saved models by driving all of them at once on one or more tracks, e.g.
+    python leaderboard.py models/ --tracks data/track1 data/track2 data/track3 --csv leaderboard.csv
+Every track is simulated in its own process by the batch engine, with all the models (grouped by their number of ray
+sensors and their layers) as one population, so hundreds of models are scored in seconds and the results are
+deterministic.
+The models are ranked by their mean number of checkpoints, then by how fast they reached the target number of
+checkpoints (one lap by default) and then by how often they crashed.
+"""
+import argparse
+import csv
+import json
+import os
+from multiprocessing import Pool
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+
+from car import CAR_IMAGE_PATH, CAR_SCALE, default_car_specification
+from evaluator import BatchEvaluator
+from model import load_model_vector
+from score_models import find_model_files
+from sensors import RaySensors
+from stall import StallRules, add_stall_arguments, stall_rules_from_arguments
+from track_bundle import TrackBundle
+from tracks import find_track_files
+from utilities import scale_image
+
+
+class CheckpointTimer:
+    """
+    Observer of BatchEvaluator remembering in which tick every car reached the target number of checkpoints.
+    """
+
+    def __init__(self, target, size):
+        self.target = target
+        self.ticks = np.full(size, -1, dtype=np.int64)
+        self.tick = 0
+
+    def __call__(self, drive):
+        self.tick += 1
+        reached = (drive.checkpoint_counter >= self.target) & (self.ticks < 0)
+        self.ticks[reached] = self.tick
+
+
+def _score_on_track(task):
+    track_directory, model_vectors, sensor_count, architecture, max_ticks, stall_rules, target_checkpoints = task
+    _, track_border_image_path, track_data_path = find_track_files(track_directory)
+    bundle = TrackBundle.load_or_compile(track_border_image_path, track_data_path)
+    evaluator = BatchEvaluator(None, scale_image(pygame.image.load(CAR_IMAGE_PATH), CAR_SCALE),
+                               default_car_specification(), bundle.checkpoints, bundle.start_position,
+                               bundle.start_angle, track_distance_field=bundle.distance_field,
+                               sensors=RaySensors(sensor_count) if sensor_count > 0 else None,
+                               stall_rules=stall_rules, architecture=architecture)
+    timer = CheckpointTimer(target_checkpoints or len(bundle.checkpoints), len(model_vectors))
+    evaluator.observer = timer
+    evaluator.evaluate(model_vectors, max_ticks=max_ticks)
+    drive = evaluator.drive
+    return drive.checkpoint_counter.copy(), timer.ticks, drive.crashed.copy()
+
+
+def score_models(paths, track_directories, max_ticks, stall_rules: StallRules, target_checkpoints=None,
+                 workers=None):
+    """
+    :return: leaderboard, one dictionary per model, best first
+    """
+    vectors, networks = {}, {}
+    for path in paths:
+        vector, sensor_count, architecture = load_model_vector(path)
+        vectors[path], networks[path] = vector, (sensor_count, architecture)
+    # models with different inputs or layers can't be stacked into one network, every shape is its own population
+    groups = {}
+    for path in paths:
+        groups.setdefault(networks[path], []).append(path)
+    tasks = [(track_directory, np.stack([vectors[path] for path in group]), sensor_count, architecture, max_ticks,
+              stall_rules, target_checkpoints)
+             for (sensor_count, architecture), group in groups.items() for track_directory in track_directories]
+    with Pool(min(len(tasks), workers or os.cpu_count())) as pool:
+        results = iter(pool.map(_score_on_track, tasks, chunksize=1))
+
+    rows = []
+    for (sensor_count, architecture), group in groups.items():
+        track_results = [next(results) for _ in track_directories]
+        checkpoints = np.array([result[0] for result in track_results])  # (tracks, models)
+        ticks = np.array([result[1] for result in track_results])
+        crashed = np.array([result[2] for result in track_results])
+        for i, path in enumerate(group):
+            reached = ticks[:, i] >= 0
+            rows.append({
+                "model": path,
+                "sensors": sensor_count,
+                "hidden_sizes": "-".join(map(str, architecture.hidden_sizes)),
+                "activation": architecture.activation,
+                "mean_checkpoints": float(checkpoints[:, i].mean()),
+                "min_checkpoints": int(checkpoints[:, i].min()),
+                "mean_ticks_to_target": float(ticks[reached, i].mean()) if reached.any() else None,
+                "tracks_reached_target": int(reached.sum()),
+                "crash_rate": float(crashed[:, i].mean()),
+                **{f"checkpoints_{os.path.basename(os.path.normpath(track))}": int(checkpoints[t, i])
+                   for t, track in enumerate(track_directories)},
+            })
+
+    rows.sort(key=lambda row: (-row["mean_checkpoints"], -row["tracks_reached_target"],
+                               row["mean_ticks_to_target"] if row["mean_ticks_to_target"] is not None else np.inf,
+                               row["crash_rate"]))
+    for rank, row in enumerate(rows, 1):
+        row["rank"] = rank
+    return rows
+
+
+def write_csv(path, rows):
+    fields = ["rank"] + [field for field in rows[0] if field != "rank"] if rows else ["rank"]
+    with open(path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Rank saved models by their results on one or more tracks.")
+    parser.add_argument("models", nargs="*", default=["models"], help="model files or directories of model files")
+    parser.add_argument("--tracks", nargs="+", default=["data/track3"], help="track directories")
+    parser.add_argument("--ticks", type=int, default=5000, help="simulation steps after which a run ends")
+    parser.add_argument("--target-checkpoints", type=int, default=None,
+                        help="checkpoints whose ticks are measured, one lap of every track by default")
+    add_stall_arguments(parser)
+    parser.add_argument("--workers", type=int, default=None, help="processes simulating the tracks")
+    parser.add_argument("--csv", default=None, help="write the leaderboard into this CSV file")
+    parser.add_argument("--json", default=None, help="write the leaderboard into this JSON file")
+    parser.add_argument("--top", type=int, default=20, help="number of models printed")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    paths = find_model_files(args.models)
+    if not paths:
+        raise SystemExit("No models found")
+    rows = score_models(paths, args.tracks, args.ticks, stall_rules_from_arguments(args), args.target_checkpoints,
+                        args.workers)
+
+    if args.csv is not None:
+        write_csv(args.csv, rows)
+    if args.json is not None:
+        with open(args.json, 'w') as file:
+            json.dump(rows, file, indent=2)
+    for row in rows[:args.top]:
+        ticks = row["mean_ticks_to_target"]
+        print(f"{row['rank']:>4}. {row['model']}: mean checkpoints {row['mean_checkpoints']:g}, "
+              f"min checkpoints {row['min_checkpoints']}, "
+              f"ticks to target {f'{ticks:.0f}' if ticks is not None else '-'} "
+              f"({row['tracks_reached_target']}/{len(args.tracks)} tracks), crash rate {row['crash_rate']:.2f}")
+
+
+if __name__ == '__main__':
+    main()
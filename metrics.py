@@ -0,0 +1,86 @@
+"""
+Streaming statistics of the training: one record per generation appended to a JSON lines or CSV file and flushed
+right away, so a long run can be followed with `tail -f` or read by a dashboard while it trains, e.g.
+    python train.py data/track3 --metrics runs/metrics.jsonl
+Only the last record is kept in memory, and nothing waits for a plot.
+"""
+import csv
+import json
+import os
+
+import numpy as np
+
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+def fitness_metrics(fitness):
+    """
+    :return: distribution of the fitness (passed checkpoints) of the evaluated population
+    """
+    fitness = np.asarray(fitness, dtype=np.float64)
+    metrics = {"mean": float(fitness.mean()), "std": float(fitness.std()), "min": float(fitness.min()),
+               "max": float(fitness.max())}
+    for percentile, value in zip(PERCENTILES, np.percentile(fitness, PERCENTILES)):
+        metrics[f"p{percentile}"] = float(value)
+    return metrics
+
+
+def diversity_metrics(population):
+    """
+    :return: mean standard deviation of every gene and mean distance of the genomes to their centroid, both go to
+    0 when the population converges to one genome
+    """
+    population = np.asarray(population, dtype=np.float64)
+    centroid = population.mean(axis=0)
+    return {"gene_std": float(population.std(axis=0).mean()),
+            "centroid_distance": float(np.linalg.norm(population - centroid, axis=1).mean())}
+
+
+def metrics_format(path):
+    return "csv" if os.path.splitext(path)[1].lower() == ".csv" else "jsonl"
+
+
+class MetricsWriter:
+    """
+    Appends flat dictionaries as lines of a JSON lines file or as rows of a CSV file (by the extension of the path).
+    Existing files are continued, e.g. when the training resumes from a checkpoint; a CSV file keeps the columns of
+    its header.
+    """
+
+    def __init__(self, path, file_format=None):
+        self.path = path
+        self.format = file_format or metrics_format(path)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.fields = None
+        if self.format == "csv" and os.path.isfile(path) and os.path.getsize(path) > 0:
+            with open(path, 'r', newline='') as file:
+                self.fields = next(csv.reader(file))
+        self.file = open(path, 'a', newline='')
+        self.writer = None
+
+    def write(self, record):
+        if self.format == "csv":
+            if self.writer is None:
+                if self.fields is None:
+                    self.fields = list(record)
+                    csv.writer(self.file).writerow(self.fields)
+                self.writer = csv.DictWriter(self.file, self.fields, extrasaction="ignore")
+            self.writer.writerow({key: "" if value is None else value for key, value in record.items()})
+        else:
+            self.file.write(json.dumps(record) + "\n")
+        # every generation is on the disk before the next one starts, for tail -f and dashboards
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+
+
+def island_metrics_path(path, index):
+    """
+    :return: path of the metrics of one island, e.g. runs/metrics-island-0.jsonl for runs/metrics.jsonl
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}-island-{index}{extension}"
@@ -0,0 +1,88 @@
+import torch
+from pygad.torchga import torchga
+
+from network import game_model_sizes, Architecture, BASE_STATE_SIZE
+from utilities import action_from_keys
+
+ACTIVATION_LAYERS = {"relu": torch.nn.ReLU, "tanh": torch.nn.Tanh, "sigmoid": torch.nn.Sigmoid}
+
+
+def generate_generic_model(sizes, activation="relu"):
+    """
+    :param sizes: sizes of all the layers, from the input to the output
+    :param activation: name of the activation between the layers, see network.ACTIVATIONS
+    """
+    layers = []
+    for in_size, out_size in zip(sizes, sizes[1:]):
+        if layers:
+            layers.append(ACTIVATION_LAYERS[activation]())
+        layers.append(torch.nn.Linear(in_size, out_size))
+    return torch.nn.Sequential(*layers)
+
+
+def generate_game_model(sensor_count=0, architecture: Architecture = None):
+    # todo consider adding 2nd/3rd checkpoint to state
+    architecture = architecture or Architecture()
+    return generate_generic_model(game_model_sizes(sensor_count, architecture), architecture.activation)
+
+
+def model_from_vector(model_vector, sensor_count=0, architecture: Architecture = None):
+    model = generate_game_model(sensor_count, architecture)
+    model.load_state_dict(torchga.model_weights_as_dict(model, model_vector))
+    return model
+
+
+def compile_model(model):
+    """
+    :return: the model compiled with TorchScript for inference, it still works with predict_action
+    """
+    return torch.jit.freeze(torch.jit.script(model.eval()))
+
+
+def predict_action(model, state):
+    with torch.no_grad():
+        prediction = model(torch.tensor(state, dtype=torch.float))
+    return action_from_keys((prediction >= 0).tolist())
+
+
+def save_model(model, path, sensor_count=0, architecture: Architecture = None):
+    """
+    Saves the weights of the model together with its architecture, so load_model can rebuild it.
+    """
+    architecture = architecture or Architecture()
+    torch.save({"state_dict": model.state_dict(), "sensor_count": sensor_count,
+                "architecture": architecture.as_dict()}, path)
+
+
+def _load_state(path):
+    # only the tensors and the plain values are read, without unpickling arbitrary objects
+    saved = torch.load(path, map_location="cpu", weights_only=True)
+    if "state_dict" in saved:
+        return saved["state_dict"], saved["sensor_count"], Architecture.from_dict(saved["architecture"])
+    # models saved before the architecture was stored are plain state dicts of Linear and ReLU layers
+    weights = [tensor for name, tensor in saved.items() if name.endswith("weight")]
+    return (saved, weights[0].shape[1] - BASE_STATE_SIZE,
+            Architecture([weight.shape[0] for weight in weights[:-1]], "relu"))
+
+
+def load_model(path):
+    """
+    :return: model saved by save_model (or a plain state dict of generate_game_model), its number of ray sensors and
+    its architecture
+    """
+    state_dict, sensor_count, architecture = _load_state(path)
+    model = generate_game_model(sensor_count, architecture)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model, sensor_count, architecture
+
+
+def load_model_vector(path):
+    """
+    Loads a saved model as a flat weight vector, the layout of torchga.model_weights_as_vector, so it can be run by
+    network.PopulationNetwork.
+    :return: weight vector, number of ray sensors and architecture of the model
+    """
+    state_dict, sensor_count, architecture = _load_state(path)
+    vector = torch.cat([tensor.flatten() for tensor in state_dict.values()]).numpy()
+    return vector, sensor_count, architecture
@@ -0,0 +1,185 @@
+import numpy as np
+
+# size of the state from Drive.get_state without any sensors
+BASE_STATE_SIZE = 8
+HIDDEN_SIZE = 64
+OUTPUT_SIZE = 4  # throttle, brake, left, right
+
+
+def _sigmoid(x):
+    # exp overflows to inf for very negative inputs, which correctly gives 0
+    with np.errstate(over="ignore"):
+        np.negative(x, out=x)
+        np.exp(x, out=x)
+    x += 1
+    np.reciprocal(x, out=x)
+
+
+# activations between the layers, by name, applied in place
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0, out=x),
+    "tanh": lambda x: np.tanh(x, out=x),
+    "sigmoid": _sigmoid,
+}
+
+
+class Architecture:
+    """
+    Hidden layers and activation of the network driving the car, its input size follows from the number of sensors.
+    """
+
+    def __init__(self, hidden_sizes=(HIDDEN_SIZE,), activation="relu"):
+        if activation not in ACTIVATIONS:
+            raise ValueError(f"unknown activation {activation}, expected one of {', '.join(ACTIVATIONS)}")
+        if not hidden_sizes or min(hidden_sizes) < 1:
+            raise ValueError("the network needs at least one hidden layer with at least one neuron")
+        self.hidden_sizes = tuple(int(size) for size in hidden_sizes)
+        self.activation = activation
+
+    def sizes(self, sensor_count=0):
+        """
+        :return: sizes of all the layers, from the input to the output
+        """
+        return (BASE_STATE_SIZE + sensor_count, *self.hidden_sizes, OUTPUT_SIZE)
+
+    def as_dict(self):
+        return {"hidden_sizes": list(self.hidden_sizes), "activation": self.activation}
+
+    @classmethod
+    def from_dict(cls, dictionary):
+        return cls(dictionary["hidden_sizes"], dictionary["activation"])
+
+    @classmethod
+    def parse(cls, hidden_sizes, activation="relu"):
+        """
+        :param hidden_sizes: sizes of the hidden layers separated by commas, e.g. "128,64"
+        """
+        return cls([int(size) for size in str(hidden_sizes).replace(" ", "").split(",") if size], activation)
+
+    def __eq__(self, other):
+        return isinstance(other, Architecture) and self.as_dict() == other.as_dict()
+
+    def __hash__(self):
+        return hash((self.hidden_sizes, self.activation))
+
+    def __repr__(self):
+        return f"Architecture({self.hidden_sizes}, {self.activation!r})"
+
+
+DEFAULT_ARCHITECTURE = Architecture()
+
+
+def game_model_sizes(sensor_count=0, architecture: Architecture = None):
+    """
+    :param sensor_count: number of ray sensors appended to the state
+    :param architecture: hidden layers of the network, None for the default one
+    :return: layer sizes of the network driving the car, see model.generate_game_model
+    """
+    return (architecture or DEFAULT_ARCHITECTURE).sizes(sensor_count)
+
+
+GAME_MODEL_SIZES = game_model_sizes()
+
+
+def vector_size(sizes=GAME_MODEL_SIZES):
+    return sum(in_size * out_size + out_size for in_size, out_size in zip(sizes, sizes[1:]))
+
+
+class PopulationNetwork:
+    """
+    Weights of the whole population stacked layer by layer, e.g. (N, 8, 64) and (N, 64, 4), so that the actions of
+    every car are computed with one batched matrix multiplication per layer instead of one model call per car.
+    The weight vectors have the layout of torchga.model_weights_as_vector of generate_game_model, so they can be
+    created from and turned back into saved torch models. The numpy backend doesn't import torch at all.
+    The network is compiled once for its architecture: the numpy backend multiplies into preallocated buffers and
+    keeps the weights of the selected rows until the selection changes, the torch backend runs one TorchScript
+    function for all the layers, so the cost of a tick doesn't grow with Python overhead for deeper networks.
+    """
+
+    def __init__(self, model_vectors, sizes=GAME_MODEL_SIZES, backend="numpy", activation="relu"):
+        self.sizes = sizes
+        self.backend = backend
+        self.activation = activation
+        model_vectors = np.asarray(model_vectors, dtype=np.float32).reshape(-1, vector_size(sizes))
+        self.weights, self.biases = [], []
+        start = 0
+        for in_size, out_size in zip(sizes, sizes[1:]):
+            # torch.nn.Linear keeps the weight as (out, in), transpose it to multiply states from the left
+            weight = model_vectors[:, start:start + in_size * out_size].reshape(-1, out_size, in_size)
+            start += in_size * out_size
+            bias = model_vectors[:, start:start + out_size]
+            start += out_size
+            self.weights.append(np.ascontiguousarray(weight.transpose(0, 2, 1)))
+            self.biases.append(np.ascontiguousarray(bias[:, np.newaxis, :]))
+
+        # outputs of every layer, the rows of the selected individuals are at the top
+        self.buffers = [np.empty((len(model_vectors), 1, out_size), dtype=np.float32) for out_size in sizes[1:]]
+        self.rows = None
+        self.row_weights, self.row_biases = self.weights, self.biases
+
+        if backend == "torch":
+            import torch
+            from torch_network import ACTIVATION_CODES
+            self.weights = [torch.from_numpy(weight) for weight in self.weights]
+            self.biases = [torch.from_numpy(bias) for bias in self.biases]
+            self.row_weights, self.row_biases = self.weights, self.biases
+            self.activation_code = ACTIVATION_CODES[activation]
+
+    def __len__(self):
+        return len(self.biases[0])
+
+    def select(self, rows):
+        """
+        :return: weights and biases of the rows, gathered again only when the rows differ from the last call
+        """
+        if rows is None:
+            return self.weights, self.biases
+        rows = np.asarray(rows)
+        if self.rows is None or self.rows.shape != rows.shape or not np.array_equal(self.rows, rows):
+            self.rows = rows.copy()
+            if self.backend == "torch":
+                import torch
+                indices = torch.from_numpy(np.flatnonzero(rows) if rows.dtype == bool else rows)
+            else:
+                indices = rows
+            self.row_weights = [weight[indices] for weight in self.weights]
+            self.row_biases = [bias[indices] for bias in self.biases]
+        return self.row_weights, self.row_biases
+
+    def predict(self, states, rows=None):
+        """
+        :param states: array of shape (len(rows), input size), one state for every selected individual
+        :param rows: indices (or a boolean mask) of the individuals to run, None for the whole population
+        :return: array of shape (len(rows), output size) with the outputs of the networks
+        """
+        return self._forward(states, rows).copy()
+
+    def _forward(self, states, rows):
+        # the result is a view of the last buffer, valid until the next call
+        weights, biases = self.select(rows)
+        if self.backend == "torch":
+            return self._forward_torch(states, weights, biases)
+        activation = ACTIVATIONS[self.activation]
+        output = np.asarray(states, dtype=np.float32)[:, np.newaxis, :]
+        count = len(output)
+        last = len(weights) - 1
+        for i, (weight, bias, buffer) in enumerate(zip(weights, biases, self.buffers)):
+            result = buffer[:count]
+            np.matmul(output, weight, out=result)
+            result += bias
+            if i < last:
+                activation(result)
+            output = result
+        return output[:, 0, :]
+
+    def _forward_torch(self, states, weights, biases):
+        import torch
+        from torch_network import forward
+        with torch.no_grad():
+            output = forward(torch.from_numpy(np.asarray(states, dtype=np.float32)), weights, biases,
+                             self.activation_code)
+        return output.numpy()
+
+    def predict_actions(self, states, rows=None):
+        # same rule as model.predict_action: a non-negative output means the key is pressed
+        return self._forward(states, rows) >= 0
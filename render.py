@@ -0,0 +1,65 @@
+import pygame
+
+COLOR_GRASS = pygame.color.Color(12, 145, 18)
+
+
+def transparent_copy(image: pygame.Surface, alpha):
+    """
+    :return: copy of the image with per pixel alpha multiplied by alpha / 255, e.g. for ghost cars
+    """
+    image = image.convert_alpha() if pygame.display.get_surface() is not None else image.copy()
+    image.fill((255, 255, 255, alpha), special_flags=pygame.BLEND_RGBA_MULT)
+    return image
+
+
+class DirtyRenderer:
+    """
+    Draws on top of a cached background and updates only the parts of the window that changed: every frame the
+    rectangles drawn in the previous frame are restored from the background, the new ones are drawn and only both
+    sets of rectangles are passed to pygame.display.update.
+    Usage: begin(), any number of blit/line/circle calls, end().
+    """
+
+    def __init__(self, window: pygame.Surface, track_image: pygame.Surface, background_color=COLOR_GRASS):
+        self.window = window
+        self.background = pygame.Surface(window.get_size())
+        self.background.fill(background_color)
+        self.background.blit(track_image, (0, 0))
+        if pygame.display.get_surface() is not None:
+            self.background = self.background.convert()
+        self.previous_rects = []
+        self.rects = []
+        self.full_redraw = True
+
+    def invalidate(self):
+        # the next frame redraws the whole window, e.g. after something else drew on it
+        self.full_redraw = True
+
+    def begin(self):
+        if self.full_redraw:
+            self.window.blit(self.background, (0, 0))
+        else:
+            for rect in self.previous_rects:
+                self.window.blit(self.background, rect, rect)
+        self.rects = []
+
+    def blit(self, image, position):
+        self.rects.append(self.window.blit(image, position))
+
+    def blits(self, sequence):
+        # many images at once, e.g. a whole population of cars
+        self.rects.extend(self.window.blits(sequence))
+
+    def line(self, color, start, end, width=1):
+        self.rects.append(pygame.draw.line(self.window, color, start, end, width))
+
+    def circle(self, color, center, radius):
+        self.rects.append(pygame.draw.circle(self.window, color, center, radius))
+
+    def end(self):
+        if self.full_redraw:
+            pygame.display.update()
+            self.full_redraw = False
+        else:
+            pygame.display.update(self.previous_rects + self.rects)
+        self.previous_rects = self.rects
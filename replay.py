@@ -0,0 +1,167 @@
+"""
+Recorded runs of the best car of a generation and their playback, e.g.
+    python replay.py checkpoints/replays.npz data/track3 --generations 1 50 100
+plays the runs of the best cars of generations 1, 50 and 100 side by side, the newest one opaque and the others as
+ghosts. The playback only draws the recorded positions, it runs neither the physics nor the network.
+Controls: space pauses, left/right seek by a second, up/down double/halve the speed, R restarts, escape quits.
+"""
+import argparse
+
+import numpy as np
+import pygame
+
+from car import CarAtlas, CAR_IMAGE_PATH, CAR_SCALE
+from render import DirtyRenderer, transparent_copy
+from tracks import find_track_files
+from utilities import scale_image
+
+FPS = 60
+GHOST_ALPHA = 110
+
+
+class Replay:
+    def __init__(self, generation, fitness, x, y, angle, actions):
+        """
+        :param generation: generation the run was recorded in
+        :param fitness: number of checkpoints the car passed
+        :param x: x of the car after every tick
+        :param y: y of the car after every tick
+        :param angle: angle of the car after every tick
+        :param actions: actions of every tick, packed with the ACTION_* bits of utilities
+        """
+        self.generation = generation
+        self.fitness = fitness
+        self.x = np.asarray(x, dtype=np.float32)
+        self.y = np.asarray(y, dtype=np.float32)
+        self.angle = np.asarray(angle, dtype=np.float32)
+        self.actions = np.asarray(actions, dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.x)
+
+
+def save_replays(path, replays):
+    # all the runs are concatenated, so a file with hundreds of them is still only a few arrays
+    lengths = np.array([len(replay) for replay in replays], dtype=np.int64)
+    np.savez_compressed(path,
+                        generation=np.array([replay.generation for replay in replays], dtype=np.int64),
+                        fitness=np.array([replay.fitness for replay in replays], dtype=np.float64),
+                        length=lengths,
+                        **{name: np.concatenate([getattr(replay, name) for replay in replays])
+                           if replays else np.zeros(0) for name in ("x", "y", "angle", "actions")})
+
+
+def load_replays(path):
+    with np.load(path) as file:
+        ends = np.cumsum(file["length"])
+        columns = [np.split(file[name], ends[:-1]) for name in ("x", "y", "angle", "actions")]
+        return [Replay(int(generation), float(fitness), *run)
+                for generation, fitness, *run in zip(file["generation"], file["fitness"], *columns)]
+
+
+class ReplayViewer:
+    def __init__(self, window, track_image, car_image, replays):
+        """
+        :param replays: runs played at the same time, the last one is drawn opaque and the others as ghosts
+        """
+        self.window = window
+        self.renderer = DirtyRenderer(window, track_image)
+        self.replays = replays
+        self.car_atlas = CarAtlas(car_image)
+        self.ghost_atlas = CarAtlas(transparent_copy(car_image, GHOST_ALPHA))
+        self.font = pygame.font.SysFont(None, 24)
+        self.tick = 0
+        self.speed = 1
+        self.paused = False
+        self.length = max((len(replay) for replay in replays), default=0)
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return True
+            if event.type != pygame.KEYDOWN:
+                continue
+            if event.key == pygame.K_ESCAPE:
+                return True
+            elif event.key == pygame.K_SPACE:
+                self.paused = not self.paused
+            elif event.key == pygame.K_LEFT:
+                self.seek(self.tick - FPS)
+            elif event.key == pygame.K_RIGHT:
+                self.seek(self.tick + FPS)
+            elif event.key == pygame.K_UP:
+                self.speed = min(self.speed * 2, 64)
+            elif event.key == pygame.K_DOWN:
+                self.speed = max(self.speed / 2, 1 / 8)
+            elif event.key == pygame.K_r:
+                self.seek(0)
+        return False
+
+    def seek(self, tick):
+        self.tick = min(max(tick, 0), max(self.length - 1, 0))
+
+    def advance(self):
+        if not self.paused:
+            self.seek(self.tick + self.speed)
+
+    def draw(self):
+        renderer = self.renderer
+        renderer.begin()
+        tick = int(self.tick)
+        for i, replay in enumerate(self.replays):
+            if len(replay) == 0:
+                continue
+            # cars whose run already ended stay where they crashed
+            frame = min(tick, len(replay) - 1)
+            atlas = self.car_atlas if i == len(self.replays) - 1 else self.ghost_atlas
+            entry = atlas.get(float(replay.angle[frame]))
+            x, y = float(replay.x[frame]), float(replay.y[frame])
+            renderer.blit(entry.image, entry.image.get_rect(center=(x + entry.pivot_offset.x,
+                                                                    y + entry.pivot_offset.y)))
+
+        generations = ", ".join(f"{replay.generation} ({replay.fitness:g})" for replay in self.replays)
+        text = (f"Tick {tick}/{self.length}  speed x{self.speed:g}{'  paused' if self.paused else ''}  "
+                f"generations: {generations}")
+        renderer.blit(self.font.render(text, True, (255, 255, 255), (0, 0, 0)), (10, 10))
+        renderer.end()
+
+    def run(self, clock):
+        while not self.handle_events():
+            clock.tick(FPS)
+            self.draw()
+            self.advance()
+
+
+def select_replays(replays, generations=None):
+    """
+    :param generations: generations to play, None for the last one
+    """
+    if generations is None:
+        return replays[-1:]
+    by_generation = {replay.generation: replay for replay in replays}
+    return [by_generation[generation] for generation in generations if generation in by_generation]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play recorded runs of the best cars.")
+    parser.add_argument("replays", help="replays file written by the training, e.g. checkpoints/replays.npz")
+    parser.add_argument("track", help="track directory the runs were recorded on, e.g. data/track3")
+    parser.add_argument("--generations", type=int, nargs="+", default=None,
+                        help="generations to play side by side, the last recorded one by default")
+    args = parser.parse_args()
+
+    replays = select_replays(load_replays(args.replays), args.generations)
+    if not replays:
+        parser.error("none of the generations were recorded")
+
+    pygame.init()
+    track_image = pygame.image.load(find_track_files(args.track)[0])
+    window = pygame.display.set_mode(track_image.get_size())
+    pygame.display.set_caption("Intelligent Racer 2D - replay")
+    car_image = scale_image(pygame.image.load(CAR_IMAGE_PATH), CAR_SCALE)
+    ReplayViewer(window, track_image.convert(), car_image.convert_alpha(), replays).run(pygame.time.Clock())
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Scores saved models on a track as fast as the CPU allows, e.g.
+    python score_models.py models/ --track data/track3
+    python score_models.py models/model-2023-01-01-12-00-00 --render-every 10
+prints the number of checkpoints, the laps, the best lap time in ticks and where the run ended of every model.
+Without --render-every no window is opened. Reading the saved models needs torch, running them doesn't.
+"""
+import argparse
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import pygame
+
+from car import CarAtlas, CAR_IMAGE_PATH, CAR_SCALE, default_car_specification
+from drive import Drive
+from evaluator import run_model, network_policy
+from model import load_model_vector
+from network import PopulationNetwork, game_model_sizes
+from sensors import RaySensors
+from stall import add_stall_arguments, stall_rules_from_arguments
+from track_bundle import TrackBundle
+from tracks import find_track_files
+from utilities import scale_image
+
+
+def find_model_files(paths):
+    """
+    :param paths: model files and directories with model files
+    :return: paths of the model files, sorted within every directory
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                         if os.path.isfile(os.path.join(path, name)) and not name.startswith("."))
+        else:
+            files.append(path)
+    return files
+
+
+def create_drive(track_directory, sensor_count, stall_rules, window=None):
+    """
+    :param window: window to draw in, None for a headless drive which only maps the track bundle
+    """
+    track_image_path, track_border_image_path, track_data_path = find_track_files(track_directory)
+    bundle = TrackBundle.load_or_compile(track_border_image_path, track_data_path)
+    car_image = scale_image(pygame.image.load(CAR_IMAGE_PATH), CAR_SCALE)
+    track_image = pygame.image.load(track_image_path) if window is not None else None
+    return Drive(window, track_image, None, car_image, default_car_specification(), bundle.checkpoints,
+                 bundle.start_position, bundle.start_angle, CarAtlas(car_image),
+                 track_distance_field=bundle.distance_field,
+                 sensors=RaySensors(sensor_count) if sensor_count > 0 else None, stall_rules=stall_rules)
+
+
+def score_model(path, args, window=None):
+    vector, sensor_count, architecture = load_model_vector(path)
+    drive = create_drive(args.track, sensor_count, stall_rules_from_arguments(args), window)
+    network = PopulationNetwork(vector, game_model_sizes(sensor_count, architecture),
+                                activation=architecture.activation)
+    return run_model(drive, network_policy(network), args.ticks, render_every=args.render_every)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Score saved models on a track without waiting for the frame rate.")
+    parser.add_argument("models", nargs="*", default=["models"], help="model files or directories of model files")
+    parser.add_argument("--track", default="data/track3", help="track directory")
+    parser.add_argument("--ticks", type=int, default=20000, help="simulation steps after which a run ends")
+    parser.add_argument("--render-every", type=int, default=0,
+                        help="draw every k-th tick in a window at full speed, 0 for no window")
+    add_stall_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    window = None
+    if args.render_every:
+        pygame.init()
+        width, height = pygame.image.load(find_track_files(args.track)[0]).get_size()
+        window = pygame.display.set_mode((width, height))
+    for path in find_model_files(args.models):
+        try:
+            print(f"{path}: {score_model(path, args, window)}", flush=True)
+        except Exception as e:
+            print(f"{path}: {e}", flush=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import numpy as np
+
+from track_field import TrackDistanceField
+
+
+class RaySensors:
+    """
+    Distances to the walls measured along rays cast from the car, appended to the state of the car.
+    The rays are marched through the distance field of the track, every step moves a ray by the distance to the
+    nearest wall, so a ray reaches a wall in a few steps and all the rays of all the cars are stepped at once.
+    """
+
+    def __init__(self, count, max_distance=200, field_of_view=180, steps=24):
+        """
+        :param count: number of rays, spread evenly across the field of view, a single ray looks straight ahead
+        :param max_distance: distance reported by rays which don't hit anything
+        :param field_of_view: angle in degrees between the leftmost and the rightmost ray
+        :param steps: number of marching steps of every ray
+        """
+        self.count = count
+        self.max_distance = max_distance
+        self.steps = steps
+        if count == 1:
+            self.angles = np.zeros(1)
+        else:
+            self.angles = np.linspace(field_of_view / 2, -field_of_view / 2, count)
+
+    def cast(self, track_distance_field: TrackDistanceField, x, y, angle):
+        """
+        :param x, y, angle: position and angle of the cars, arrays of shape (cars,)
+        :return: array of shape (cars, count) with the distances to the walls
+        """
+        angles = np.radians(np.asarray(angle, dtype=np.float64)[:, np.newaxis] + self.angles)
+        # forward direction of the car, see Car.move
+        direction_x, direction_y = -np.sin(angles), -np.cos(angles)
+        x = np.asarray(x, dtype=np.float64)[:, np.newaxis]
+        y = np.asarray(y, dtype=np.float64)[:, np.newaxis]
+        travelled = np.zeros(angles.shape)
+        for _ in range(self.steps):
+            distance = track_distance_field.distance(x + direction_x * travelled, y + direction_y * travelled)
+            # at least a pixel per step, otherwise rays grazing a wall would barely move
+            travelled += np.where(distance < 1, 0, np.maximum(distance, 1))
+            np.minimum(travelled, self.max_distance, out=travelled)
+        return travelled
+
+    def cast_one(self, track_distance_field: TrackDistanceField, x, y, angle):
+        return self.cast(track_distance_field, [x], [y], [angle])[0]
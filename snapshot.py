@@ -0,0 +1,71 @@
+import glob
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+def write_snapshot(path, arrays, metadata):
+    """
+    Writes the arrays and the JSON serializable metadata into an npz file. The file is written under a temporary name
+    first, so a crash while writing never leaves a broken snapshot behind.
+    """
+    temporary_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary_path, 'wb') as file:
+        np.savez(file, metadata=np.array(json.dumps(metadata)), **arrays)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path):
+    """
+    :return: dictionary of the arrays and the metadata of the snapshot
+    """
+    with np.load(path) as file:
+        arrays = {name: file[name] for name in file.files if name != "metadata"}
+        metadata = json.loads(str(file["metadata"])) if "metadata" in file.files else {}
+    return arrays, metadata
+
+
+def find_latest_snapshot(directory, pattern="generation-*.npz"):
+    """
+    :return: path of the snapshot of the highest generation in the directory, None if there is none
+    """
+    def generation(path):
+        match = re.search(r"(\d+)\.npz$", path)
+        return int(match.group(1)) if match else -1
+
+    paths = glob.glob(os.path.join(directory, pattern))
+    return max(paths, key=generation) if paths else None
+
+
+class SnapshotWriter:
+    """
+    Writes snapshots in a background thread, one after another, so the training doesn't wait for the disk.
+    The arrays must not be changed after they are passed to write.
+    """
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = []
+
+    def write(self, path, arrays, metadata):
+        # errors of already finished writes are raised by the next one
+        for future in [future for future in self.pending if future.done()]:
+            self.pending.remove(future)
+            future.result()
+        self.pending.append(self.executor.submit(write_snapshot, path, arrays, metadata))
+
+    def wait(self):
+        # raises the errors of the failed writes
+        pending, self.pending = self.pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        self.wait()
+        self.executor.shutdown()
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+class StallRules:
+    """
+    Rules for retiring cars which won't get any further before they crash or run out of ticks.
+    Every rule is disabled with None.
+    """
+
+    def __init__(self, progress_ticks=None, idle_ticks=None, idle_speed=0.01, backwards_ticks=None):
+        """
+        :param progress_ticks: retire a car which didn't pass a checkpoint for this many ticks
+        :param idle_ticks: retire a car which was slower than idle_speed for this many ticks
+        :param idle_speed: speed below which a car counts as standing still
+        :param backwards_ticks: retire a car which moved away from its next checkpoint for this many ticks in a row
+        """
+        self.progress_ticks = progress_ticks
+        self.idle_ticks = idle_ticks
+        self.idle_speed = idle_speed
+        self.backwards_ticks = backwards_ticks
+
+    def enabled(self):
+        return self.progress_ticks is not None or self.idle_ticks is not None or self.backwards_ticks is not None
+
+
+def default_stall_rules():
+    # cars which pass no checkpoint for 5 seconds or stand still for 1 second at 60 ticks per second
+    return StallRules(progress_ticks=300, idle_ticks=60)
+
+
+def add_stall_arguments(parser):
+    """
+    Adds the --stall-* options of the command line tools, see stall_rules_from_arguments.
+    """
+    defaults = default_stall_rules()
+    parser.add_argument("--stall-progress-ticks", type=int, default=defaults.progress_ticks,
+                        help="retire cars which didn't pass a checkpoint for this many ticks, 0 to disable")
+    parser.add_argument("--stall-idle-ticks", type=int, default=defaults.idle_ticks,
+                        help="retire cars which stood still for this many ticks, 0 to disable")
+    parser.add_argument("--stall-backwards-ticks", type=int, default=defaults.backwards_ticks or 0,
+                        help="retire cars which drove away from their next checkpoint for this many ticks, "
+                             "0 to disable")
+
+
+def stall_rules_from_arguments(args):
+    return StallRules(progress_ticks=args.stall_progress_ticks or None, idle_ticks=args.stall_idle_ticks or None,
+                      backwards_ticks=args.stall_backwards_ticks or None)
+
+
+class StallTracker:
+    """
+    Counters of the stall rules for a number of cars, updated after every step.
+    """
+
+    def __init__(self, rules: StallRules, size):
+        self.rules = rules
+        self.ticks_without_progress = np.zeros(size, dtype=np.int64)
+        self.idle_ticks = np.zeros(size, dtype=np.int64)
+        self.backwards_ticks = np.zeros(size, dtype=np.int64)
+        self.checkpoint_counter = np.zeros(size, dtype=np.int64)
+        self.distance = np.full(size, np.inf)
+
+    def update(self, cars, checkpoint_counter, speed, distance):
+        """
+        :param cars: boolean mask of the cars which moved in this step
+        :param checkpoint_counter, speed: state of all the cars after the step
+        :param distance: distance of every car to its next checkpoint
+        :return: boolean mask of the cars which should be retired
+        """
+        rules = self.rules
+        stalled = np.zeros(len(cars), dtype=bool)
+        progressed = checkpoint_counter != self.checkpoint_counter
+
+        if rules.progress_ticks is not None:
+            self.ticks_without_progress[cars] += 1
+            self.ticks_without_progress[progressed] = 0
+            stalled |= self.ticks_without_progress >= rules.progress_ticks
+
+        if rules.idle_ticks is not None:
+            idle = cars & (speed < rules.idle_speed)
+            self.idle_ticks[idle] += 1
+            self.idle_ticks[cars & ~idle] = 0
+            stalled |= self.idle_ticks >= rules.idle_ticks
+
+        if rules.backwards_ticks is not None:
+            # after passing a checkpoint the distance is measured to the next one, so it doesn't count as backwards
+            backwards = cars & (distance > self.distance) & ~progressed
+            self.backwards_ticks[backwards] += 1
+            self.backwards_ticks[cars & ~backwards] = 0
+            stalled |= self.backwards_ticks >= rules.backwards_ticks
+
+        self.checkpoint_counter[cars] = checkpoint_counter[cars]
+        self.distance[cars] = distance[cars]
+        return stalled & cars
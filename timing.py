@@ -0,0 +1,28 @@
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class PhaseTimer:
+    """
+    Accumulates the wall time spent in named phases, e.g.
+        with timer.phase("physics"):
+            ...
+    """
+
+    def __init__(self):
+        self.totals = defaultdict(float)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.totals[name] += time.perf_counter() - start
+
+    def reset(self):
+        self.totals.clear()
+
+    def as_dict(self):
+        return dict(self.totals)
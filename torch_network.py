@@ -0,0 +1,32 @@
+"""
+TorchScript inference of network.PopulationNetwork, imported only by its torch backend.
+"""
+from typing import List
+
+import torch
+
+# activations of network.ACTIVATIONS as numbers, TorchScript compiles the branches of all of them once
+ACTIVATION_CODES = {"relu": 0, "tanh": 1, "sigmoid": 2}
+
+
+@torch.jit.script
+def forward(states: torch.Tensor, weights: List[torch.Tensor], biases: List[torch.Tensor],
+            activation: int) -> torch.Tensor:
+    """
+    :param states: (N, input size)
+    :param weights: (N, in, out) of every layer
+    :param biases: (N, 1, out) of every layer
+    :return: (N, output size)
+    """
+    output = states.unsqueeze(1)
+    last = len(weights) - 1
+    for i in range(len(weights)):
+        output = torch.baddbmm(biases[i], output, weights[i])
+        if i < last:
+            if activation == 0:
+                output = torch.relu(output)
+            elif activation == 1:
+                output = torch.tanh(output)
+            else:
+                output = torch.sigmoid(output)
+    return output.squeeze(1)
@@ -0,0 +1,129 @@
+"""
+Compiled track bundles, e.g.
+    python track_bundle.py data/track1 data/track2 data/track3
+compiles the tracks into track.bundle files next to their track_data.json.
+A bundle holds everything the simulation needs from a track (bit-packed border mask, distance field, checkpoints and
+start pose) as raw arrays, so loading a track is a memory map instead of decoding PNGs, and all the processes using
+the same track share its pages read-only.
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pygame
+
+from track_field import TrackDistanceField, compute_distance_field
+from tracks import find_track_files, load_track_data
+from utilities import mask_to_array
+
+BUNDLE_FILENAME = "track.bundle"
+MAGIC = b"IR2DTRK2"
+ALIGNMENT = 64
+
+
+def source_files(track_border_image_path, track_data_path):
+    """
+    :return: identity of the files a bundle is compiled from, it has to be compiled again when any of them changes
+    """
+    sources = {}
+    for name, path in (("border", track_border_image_path), ("data", track_data_path)):
+        stat = os.stat(path)
+        sources[name] = {"path": os.path.realpath(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    return sources
+
+
+def _align(size):
+    return -(-size // ALIGNMENT) * ALIGNMENT
+
+
+def read_header(path):
+    """
+    :return: header of the bundle and the position of its first array, the offsets of the arrays are relative to it
+    """
+    with open(path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a track bundle of this version")
+        header_size = int.from_bytes(file.read(8), "little")
+        return json.loads(file.read(header_size)), _align(len(MAGIC) + 8 + header_size)
+
+
+def compile_track(track_border_image_path, track_data_path, bundle_path):
+    border = mask_to_array(pygame.mask.from_surface(pygame.image.load(track_border_image_path)))
+    checkpoints, start_position, start_angle = load_track_data(track_data_path)
+    arrays = {
+        "border_bits": np.packbits(border, axis=1),
+        "distance_field": compute_distance_field(border),
+        "checkpoints": np.array(checkpoints, dtype=np.float64).reshape(-1, 2, 2),
+    }
+
+    header = {"width": border.shape[0], "height": border.shape[1], "start_position": list(start_position),
+              "start_angle": start_angle, "sources": source_files(track_border_image_path, track_data_path),
+              "arrays": {}}
+    # the offsets are relative to the end of the header, so they don't depend on its size (e.g. of the source paths)
+    offset = 0
+    for name, array in arrays.items():
+        header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset += _align(array.nbytes)
+    header_bytes = json.dumps(header).encode()
+    data_offset = _align(len(MAGIC) + 8 + len(header_bytes))
+
+    # written to a temporary file first, so other processes never see a half written bundle
+    temporary_path = f"{bundle_path}.{os.getpid()}.tmp"
+    with open(temporary_path, 'wb') as file:
+        file.write(MAGIC)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+        for name, array in arrays.items():
+            file.seek(data_offset + header["arrays"][name]["offset"])
+            file.write(np.ascontiguousarray(array).tobytes())
+    os.replace(temporary_path, bundle_path)
+
+
+class TrackBundle:
+    def __init__(self, path):
+        header, data_offset = read_header(path)
+        self.path = path
+        self.width, self.height = header["width"], header["height"]
+        self.start_position = header["start_position"]
+        self.start_angle = header["start_angle"]
+        self.arrays = {name: np.memmap(path, dtype=np.dtype(spec["dtype"]), mode='r',
+                                       offset=data_offset + spec["offset"], shape=tuple(spec["shape"]))
+                       for name, spec in header["arrays"].items()}
+        self.checkpoints = self.arrays["checkpoints"].tolist()
+        self.distance_field = TrackDistanceField(self.arrays["distance_field"])
+
+    def border(self):
+        """
+        :return: boolean array of shape (width, height), True for the pixels of the border
+        """
+        return np.unpackbits(self.arrays["border_bits"], axis=1, count=self.height).astype(bool)
+
+    @classmethod
+    def load_or_compile(cls, track_border_image_path, track_data_path):
+        """
+        Memory maps the bundle next to track_data.json, compiling it first if there is none or it was compiled from
+        other files than the given ones (e.g. another border image loaded for the same track data) or from older
+        versions of them.
+        """
+        path = os.path.join(os.path.dirname(track_data_path), BUNDLE_FILENAME)
+        sources = source_files(track_border_image_path, track_data_path)
+        try:
+            compiled = read_header(path)[0].get("sources") == sources
+        except (OSError, ValueError):
+            compiled = False
+        if not compiled:
+            compile_track(track_border_image_path, track_data_path, path)
+        return cls(path)
+
+
+def main():
+    for directory in sys.argv[1:]:
+        _, track_border_image_path, track_data_path = find_track_files(directory)
+        bundle_path = os.path.join(directory, BUNDLE_FILENAME)
+        compile_track(track_border_image_path, track_data_path, bundle_path)
+        print(f"Compiled {directory} into {bundle_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import numpy as np
+import pygame
+
+from utilities import mask_to_array
+
+# distances are only computed up to this many pixels, everything further away is treated as this far
+MAX_DISTANCE = 255
+# the corners of the car sprite are rounded off by about this many pixels, its corner points are moved in by it
+CORNER_INSET = 2
+
+
+def compute_distance_field(border):
+    """
+    Euclidean distance from every pixel to the nearest pixel of the border, capped at MAX_DISTANCE.
+    :param border: boolean array of shape (width, height), True for the pixels of the border
+    :return: float32 array of the same shape
+    """
+    width, height = border.shape
+    # distance to the nearest border pixel in the same column, from above and from below
+    rows = np.arange(height)
+    above = np.maximum.accumulate(np.where(border, rows, -2 * MAX_DISTANCE), axis=1)
+    below = np.minimum.accumulate(np.where(border, rows, height + 2 * MAX_DISTANCE)[:, ::-1], axis=1)[:, ::-1]
+    column_distance = np.minimum(np.minimum(rows - above, below - rows), MAX_DISTANCE).astype(np.float32)
+
+    # the nearest border pixel in the whole image lies in some column dx pixels away
+    squared = column_distance ** 2
+    result = squared.copy()
+    for dx in range(1, min(MAX_DISTANCE, width)):
+        if dx * dx >= result.max():
+            break
+        np.minimum(result[dx:], squared[:-dx] + dx * dx, out=result[dx:])
+        np.minimum(result[:-dx], squared[dx:] + dx * dx, out=result[:-dx])
+    return np.sqrt(result)
+
+
+class TrackDistanceField:
+    """
+    Distance to the nearest wall for every pixel of the track, computed once per track and stored in its track bundle
+    (see track_bundle.py). Collisions of a car are checked by looking up a few points of the car: its body is a chain of
+    circles as wide as the car, and its corners, which the circles round off, are checked for lying on a wall pixel.
+    """
+
+    def __init__(self, distances):
+        self.distances = distances
+        self.width, self.height = distances.shape
+
+    @classmethod
+    def from_border_image(cls, track_border_image: pygame.Surface):
+        return cls(compute_distance_field(mask_to_array(pygame.mask.from_surface(track_border_image))))
+
+    def distance(self, x, y):
+        """
+        :return: distance to the nearest wall at the given points, MAX_DISTANCE outside of the track image
+        """
+        x = np.asarray(x).astype(np.int64)
+        y = np.asarray(y).astype(np.int64)
+        inside = (x >= 0) & (x < self.width) & (y >= 0) & (y < self.height)
+        return np.where(inside, self.distances[np.where(inside, x, 0), np.where(inside, y, 0)], MAX_DISTANCE)
+
+    def collides(self, x, y, angle, car_width, car_height):
+        """
+        :param x, y, angle: position and angle of the cars, scalars or arrays
+        :return: True (or a boolean array) for every car touching a wall
+        """
+        radius = car_width / 2
+        angle = np.radians(angle)
+        # forward direction of the car, see Car.move
+        forward_x, forward_y = -np.sin(angle), -np.cos(angle)
+        collided = False
+        # centres of the circles from the back to the front of the car
+        for offset in np.linspace(radius - car_height / 2, car_height / 2 - radius, max(round(car_height / radius), 2)):
+            collided = collided | (self.distance(x + forward_x * offset, y + forward_y * offset) < radius)
+        # the distance is 0 on the wall pixels and at least 1 next to them
+        half_width, half_length = car_width / 2 - CORNER_INSET, car_height / 2 - CORNER_INSET
+        for side in (-half_width, half_width):
+            for offset in (-half_length, half_length):
+                # sideways is the forward direction turned by 90 degrees
+                corner_x = x - forward_y * side + forward_x * offset
+                corner_y = y + forward_x * side + forward_y * offset
+                collided = collided | (self.distance(corner_x, corner_y) < 1)
+        return collided
@@ -0,0 +1,26 @@
+import json
+import os
+
+
+def find_track_files(directory):
+    """
+    Finds the files of a track in its directory: the track image, the track border image (the PNG ending with
+    "_border") and track_data.json.
+    :return: track image path, track border image path, track data path
+    """
+    images = sorted(name for name in os.listdir(directory) if name.endswith(".png"))
+    borders = [name for name in images if name[:-len(".png")].endswith("_border")]
+    tracks = [name for name in images if name not in borders]
+    if len(borders) != 1 or len(tracks) != 1:
+        raise ValueError(f"{directory} should contain exactly one track image and one track border image")
+    return (os.path.join(directory, tracks[0]), os.path.join(directory, borders[0]),
+            os.path.join(directory, "track_data.json"))
+
+
+def load_track_data(path):
+    """
+    :return: checkpoints, start position, start angle
+    """
+    with open(path, 'r') as file:
+        checkpoints, start_position, start_angle = json.load(file)
+    return checkpoints, start_position, start_angle
@@ -0,0 +1,192 @@
+"""
+Headless training from the command line, e.g.
+    python train.py data/track3 --generations 100 --population 200 --checkpoint-every 10
+    python train.py data/track1 data/track2 data/track3 --aggregate min
+    python train.py data/track3 --hidden-sizes 32 32 --activation tanh
+    python train.py data/track3 --metrics runs/metrics.jsonl
+It never opens a window and imports only what the training needs, so it can run on servers without a display.
+"""
+import argparse
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # never open a window
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from network import Architecture, ACTIVATIONS
+from stall import add_stall_arguments, stall_rules_from_arguments
+from tracks import find_track_files
+from islands import IslandTrainer, check_migrants, spread_island_settings
+from metrics import MetricsWriter
+from replay import save_replays
+from snapshot import find_latest_snapshot
+from trainer import Trainer
+
+
+def add_trainer_arguments(parser):
+    """
+    Adds the options of the training shared by train.py and benchmark.py, see configure_trainer.
+    """
+    parser.add_argument("--population", type=int, default=50)
+    parser.add_argument("--crossover-chance", type=float, default=0.8)
+    parser.add_argument("--mutation-chance", type=float, default=0.03)
+    parser.add_argument("--mutation-percent-genes", type=float, default=0.005)
+    parser.add_argument("--ticks", type=int, default=600, help="simulation steps of every generation")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--engine", choices=("batch", "processes"), default="batch")
+    parser.add_argument("--backend", choices=("numpy", "torch"), default="numpy",
+                        help="network backend of the batch engine")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes of the processes engine")
+    parser.add_argument("--sensors", type=int, default=0, help="number of ray sensors")
+    parser.add_argument("--hidden-sizes", type=int, nargs="+", default=[64],
+                        help="neurons of every hidden layer of the networks, e.g. --hidden-sizes 128 64")
+    parser.add_argument("--activation", choices=tuple(ACTIVATIONS), default="relu",
+                        help="activation between the layers of the networks")
+    add_stall_arguments(parser)
+    parser.add_argument("--no-fitness-cache", action="store_true",
+                        help="evaluate every genome, even if its fitness is already known")
+
+
+def configure_trainer(trainer, args):
+    """
+    Applies the options of add_trainer_arguments to the trainer, before its population is created.
+    """
+    trainer.population_size = args.population
+    trainer.crossover_chance = args.crossover_chance
+    trainer.mutation_chance = args.mutation_chance
+    trainer.mutation_percent_genes = args.mutation_percent_genes
+    trainer.generation_ticks = args.ticks
+    trainer.seed = args.seed
+    trainer.engine = args.engine
+    trainer.backend = args.backend
+    if args.workers is not None:
+        trainer.workers = args.workers
+    trainer.sensor_count = args.sensors
+    trainer.architecture = Architecture(args.hidden_sizes, args.activation)
+    trainer.use_fitness_cache = not args.no_fitness_cache
+    trainer.stall_rules = stall_rules_from_arguments(args)
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Train the AI on a track without opening a window.")
+    parser.add_argument("tracks", nargs="+",
+                        help="track directories, e.g. data/track3, with more than one the fitness is computed on all "
+                             "of them at once")
+    parser.add_argument("--aggregate", choices=("mean", "min"), default="mean",
+                        help="how the results on several tracks are combined")
+    parser.add_argument("--generations", type=int, default=100)
+    add_trainer_arguments(parser)
+    parser.add_argument("--record-replays", action="store_true",
+                        help="record the run of the best car of every generation into replays.npz in the checkpoint "
+                             "directory, see replay.py")
+    parser.add_argument("--islands", type=int, default=1,
+                        help="number of populations evolving in their own processes, each with its own crossover and "
+                             "mutation chance spread around the given ones, 1 for a single population")
+    parser.add_argument("--migration-interval", type=int, default=5, help="generations between migrations")
+    parser.add_argument("--migrants", type=int, default=2,
+                        help="best individuals every island sends to the next one at a migration")
+    parser.add_argument("--checkpoint-dir", default="checkpoints")
+    parser.add_argument("--checkpoint-every", type=int, default=10, help="generations between checkpoints")
+    parser.add_argument("--metrics", default=None,
+                        help="append the statistics of every generation to this JSON lines file, or CSV file if it "
+                             "ends with .csv; with islands every island writes its own file")
+    parser.add_argument("--resume", default=None,
+                        help="checkpoint to continue the training from, or a directory to continue from its latest "
+                             "checkpoint; the hyperparameters and the random state are taken from the checkpoint")
+    args = parser.parse_args()
+    if args.islands > 1:
+        try:
+            check_migrants(args.migrants, args.population)
+        except ValueError as e:
+            parser.error(f"--migrants: {e}")
+        # every island saves its own checkpoint, which is resumed without --islands as a single population
+        for name, value in (("--resume", args.resume), ("--record-replays", args.record_replays)):
+            if value:
+                parser.error(f"{name} can't be combined with --islands")
+    return args
+
+
+def create_trainer(args):
+    trainer = Trainer(*find_track_files(args.tracks[0]))
+    if len(args.tracks) > 1:
+        trainer.fitness_track_directories = args.tracks
+        trainer.fitness_aggregate = args.aggregate
+    configure_trainer(trainer, args)
+    trainer.record_replays = args.record_replays
+    if args.resume is not None:
+        path = find_latest_snapshot(args.resume) if os.path.isdir(args.resume) else args.resume
+        if path is None:
+            raise SystemExit(f"No checkpoint in {args.resume}")
+        print(f"Resuming from {path}")
+        trainer.load_checkpoint(path)
+    else:
+        trainer.create_new_population()
+    return trainer
+
+
+def create_island_trainer(args):
+    return IslandTrainer(find_track_files(args.tracks[0]),
+                         spread_island_settings(args.islands, args.crossover_chance, args.mutation_chance),
+                         population_size=args.population, migration_interval=args.migration_interval,
+                         migrants=args.migrants, seed=args.seed, mutation_percent_genes=args.mutation_percent_genes,
+                         generation_ticks=args.ticks, sensor_count=args.sensors,
+                         fitness_track_directories=args.tracks if len(args.tracks) > 1 else None,
+                         fitness_aggregate=args.aggregate, stall_rules=stall_rules_from_arguments(args),
+                         backend=args.backend,
+                         architecture=Architecture(args.hidden_sizes, args.activation), metrics_path=args.metrics,
+                         engine=args.engine, workers=args.workers, use_fitness_cache=not args.no_fitness_cache)
+
+
+def train_islands(args):
+    island_trainer = create_island_trainer(args)
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    saved = None
+    try:
+        trained = 0
+        while trained < args.generations:
+            # between the checkpoints the islands run on their own
+            generations = min(args.checkpoint_every - trained % args.checkpoint_every, args.generations - trained)
+            stats = island_trainer.train(generations)
+            for generation in range(generations):
+                bests = [island_stats[generation][2] for island_stats in stats]
+                print(f"Generation: {trained + generation + 1}, best checkpoints of every island: {bests}", flush=True)
+            trained += generations
+            island_trainer.save_checkpoints(args.checkpoint_dir)
+            saved = island_trainer.generation
+    finally:
+        try:
+            # like a single population, an interrupted run keeps its last generations
+            if saved != island_trainer.generation:
+                island_trainer.save_checkpoints(args.checkpoint_dir)
+        finally:
+            island_trainer.close()
+
+
+def main():
+    args = parse_arguments()
+    if args.islands > 1:
+        train_islands(args)
+        return
+    trainer = create_trainer(args)
+    os.makedirs(args.checkpoint_dir, exist_ok=True)
+    if args.metrics is not None:
+        trainer.metrics_writer = MetricsWriter(args.metrics)
+    try:
+        for _ in range(args.generations):
+            mean, median, best = trainer.train_generation()
+            cache = trainer.fitness_cache
+            print(f"Generation: {trainer.generation}, mean checkpoints: {mean}, median checkpoints: {median}, "
+                  f"best checkpoints: {best}, fitness cache hits/misses: {cache.hits}/{cache.misses}", flush=True)
+            if trainer.generation % args.checkpoint_every == 0:
+                trainer.save_checkpoint(os.path.join(args.checkpoint_dir, f"generation-{trainer.generation}.npz"),
+                                        background=True)
+    finally:
+        trainer.save_checkpoint(os.path.join(args.checkpoint_dir, f"generation-{trainer.generation}.npz"))
+        if trainer.replays:
+            save_replays(os.path.join(args.checkpoint_dir, "replays.npz"), trainer.replays)
+        trainer.close()
+        if trainer.metrics_writer is not None:
+            trainer.metrics_writer.close()
+
+
+if __name__ == '__main__':
+    main()
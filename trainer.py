@@ -0,0 +1,387 @@
+import os
+import random
+import statistics
+import time
+
+import numpy as np
+import numpy.random as npr
+import pygame
+
+from car import CarSpecification, CAR_IMAGE_PATH, CAR_SCALE, default_car_specification
+from evaluator import PopulationEvaluator, BatchEvaluator, MultiTrackEvaluator
+from fitness_cache import FitnessCache
+from genetic import ELITE_COPIES, random_population, next_generation
+from metrics import fitness_metrics, diversity_metrics
+from network import Architecture, game_model_sizes
+from replay import Replay
+from sensors import RaySensors
+from snapshot import SnapshotWriter, write_snapshot, read_snapshot
+from stall import StallRules, default_stall_rules
+from timing import PhaseTimer
+from track_bundle import TrackBundle
+from tracks import find_track_files
+from utilities import scale_image
+
+
+def set_seed(seed):
+    # every source of randomness used by the training, so that runs with the same seed give the same results
+    random.seed(seed)
+    npr.seed(seed)
+
+
+class Trainer:
+    """
+    Headless training of the AI: evaluation of the population on a track and the genetic algorithm.
+    Used by the training menu of the game and by the train command (train.py), it never needs a display or torch.
+    """
+
+    def __init__(self, track_image_path, track_border_image_path, track_data_path,
+                 car_specification: CarSpecification = None, car_image: pygame.Surface = None):
+        self.car_specification = car_specification if car_specification is not None else default_car_specification()
+        self.car_image_path = CAR_IMAGE_PATH
+        if car_image is None:
+            car_image = scale_image(pygame.image.load(self.car_image_path), CAR_SCALE)
+        self.car_image = car_image
+
+        self.generation = 0
+        self.generation_stats = []  # (mean, median, best)
+        self.population_size = 50
+        self.crossover_chance = 0.8
+        self.mutation_chance = 0.03
+        self.mutation_percent_genes = 0.005
+        self.generation_time = 2000
+        # when enabled, every generation runs a fixed number of simulation steps instead of until generation_time
+        # passes, so the results don't depend on the speed or the load of the machine
+        self.use_tick_budget = True
+        self.generation_ticks = 600
+        self.seed = None
+        self.workers = os.cpu_count()
+        # "batch" simulates the whole population at once in this process, "processes" runs every model in a pool
+        self.engine = "batch"
+        # backend of PopulationNetwork used by the batch engine, "numpy" or "torch"
+        self.backend = "numpy"
+        self.evaluator = None
+        # directories of the tracks the fitness is computed on, None for only the loaded track
+        self.fitness_track_directories = None
+        # how the results on those tracks are combined, "mean" or "min"
+        self.fitness_aggregate = "mean"
+        # number of ray sensors appended to the state of the car, 0 for none
+        self.sensor_count = 0
+        # hidden layers and activation of the networks, changing it needs a new population
+        self.architecture = Architecture()
+        # cars which stand still or make no progress are retired before the end of the generation
+        self.stall_rules = default_stall_rules()
+        self.timer = PhaseTimer()
+        # fitness of already evaluated genomes, only used with the tick budget because only then it is deterministic
+        self.fitness_cache = FitnessCache()
+        self.use_fitness_cache = True
+        # when enabled, the run of the best car of every generation is recorded, only by the batch engine
+        self.record_replays = False
+        self.replays = []
+        self._replay_genome = None
+        # rows of the population evaluated in the last generation, in the order of the evaluator, None for all
+        self._evaluated_rows = None
+        self.snapshot_writer = SnapshotWriter()
+        # called with the BatchDrive after every tick of the batch engine, e.g. viewer.GenerationViewer
+        self.evaluation_observer = None
+        # receives the metrics of every generation, e.g. metrics.MetricsWriter, the trainer doesn't close it
+        self.metrics_writer = None
+        self.metrics = None  # metrics of the last generation
+        self.evaluation_seconds = 0
+        self.evaluated_car_steps = None
+
+        self.track_image_path = self.track_border_image_path = self.track_data_path = None
+        self.checkpoints = self.start_position = self.start_angle = None
+        self.track_distance_field = None
+        self.load_track(track_image_path, track_border_image_path, track_data_path)
+
+        self.population = None  # (population_size, genes) array, one weight vector of the model per row
+        self.fitness = None
+        self.evaluated_population = self.evaluated_fitness = None
+        self.create_new_population()
+
+    def load_track(self, track_image_path, track_border_image_path, track_data_path):
+        self.track_image_path = track_image_path
+        self.track_border_image_path = track_border_image_path
+        self.track_data_path = track_data_path
+        bundle = TrackBundle.load_or_compile(track_border_image_path, track_data_path)
+        self.checkpoints, self.start_position, self.start_angle = (bundle.checkpoints, bundle.start_position,
+                                                                   bundle.start_angle)
+        self.track_distance_field = bundle.distance_field
+        self.close_evaluator()
+
+    def model_sizes(self):
+        return game_model_sizes(self.sensor_count, self.architecture)
+
+    def get_sensors(self):
+        return RaySensors(self.sensor_count) if self.sensor_count > 0 else None
+
+    def get_evaluator(self):
+        # the worker processes keep the loaded track between generations, they are only restarted when it changes
+        if self.evaluator is None and self.fitness_track_directories:
+            self.evaluator = MultiTrackEvaluator([find_track_files(directory)
+                                                  for directory in self.fitness_track_directories],
+                                                 self.car_image_path, CAR_SCALE, self.car_specification,
+                                                 self.fitness_aggregate, self.backend, self.get_sensors(),
+                                                 self.stall_rules, self.architecture)
+        elif self.evaluator is None and self.engine == "batch":
+            self.evaluator = BatchEvaluator(None, self.car_image, self.car_specification, self.checkpoints,
+                                            self.start_position, self.start_angle, self.backend,
+                                            track_distance_field=self.track_distance_field,
+                                            sensors=self.get_sensors(), stall_rules=self.stall_rules,
+                                            architecture=self.architecture)
+        elif self.evaluator is None:
+            self.evaluator = PopulationEvaluator(self.track_border_image_path, self.track_data_path,
+                                                 self.car_image_path, CAR_SCALE, self.car_specification,
+                                                 self.workers, self.get_sensors(), self.stall_rules,
+                                                 self.architecture)
+        return self.evaluator
+
+    def uses_batch_evaluator(self):
+        """
+        :return: whether the population is simulated in this process by BatchEvaluator, the only evaluator calling
+        evaluation_observer and recording replays
+        """
+        return not self.fitness_track_directories and self.engine == "batch"
+
+    def close_evaluator(self):
+        if isinstance(self.evaluator, (PopulationEvaluator, MultiTrackEvaluator)):
+            self.evaluator.close()
+        self.evaluator = None
+
+    def create_new_population(self):
+        if self.seed is not None:
+            set_seed(self.seed)
+        self.population = random_population(self.population_size, self.model_sizes())
+        self.fitness = np.full(self.population_size, -1)
+        self.generation = 0
+        self.generation_stats = []
+        self.evaluated_population = self.evaluated_fitness = None
+        self.replays = []
+        self._replay_genome = None
+
+    def evaluation_context(self):
+        """
+        :return: bytes identifying everything except the genome the fitness depends on
+        """
+        spec = self.car_specification
+        stall = self.stall_rules
+        if self.fitness_track_directories:
+            tracks = tuple((directory, os.path.getmtime(find_track_files(directory)[1]))
+                           for directory in self.fitness_track_directories)
+        else:
+            tracks = None
+        context = (
+            tracks, self.fitness_aggregate,
+            self.track_data_path, os.path.getmtime(self.track_data_path),
+            self.track_border_image_path, os.path.getmtime(self.track_border_image_path),
+            spec.acceleration, spec.deceleration, spec.brake_power, spec.max_speed, spec.max_angle,
+            self.car_image.get_size(), self.generation_ticks, self.sensor_count, self.architecture, self.engine,
+            self.backend,
+            (stall.progress_ticks, stall.idle_ticks, stall.idle_speed, stall.backwards_ticks) if stall else None,
+        )
+        return repr(context).encode()
+
+    def evaluate_population(self):
+        self._evaluated_rows = None
+        evaluator = self.get_evaluator()
+        recording = self.record_replays and isinstance(evaluator, BatchEvaluator)
+        if isinstance(evaluator, BatchEvaluator):
+            evaluator.recording = recording
+            evaluator.observer = self.evaluation_observer
+        start = time.perf_counter()
+        with self.timer.phase("evaluation"):
+            if not self.use_tick_budget:
+                # every run gets the whole time from its own start, runs queued for a worker aren't cut short
+                results = self.get_evaluator().evaluate(self.population, time_budget=self.generation_time / 1000)
+            elif not self.use_fitness_cache:
+                results = self.get_evaluator().evaluate(self.population, max_ticks=self.generation_ticks)
+            else:
+                results = self.evaluate_with_cache()
+        self.evaluation_seconds = time.perf_counter() - start
+        # every evaluator counts its simulation steps, none are made when every fitness was cached
+        self.evaluated_car_steps = 0 if self._evaluated_rows == [] else evaluator.car_steps
+        self.fitness = np.array(results)
+        if recording:
+            self.record_best_replay()
+
+    def evaluate_with_cache(self):
+        context = self.evaluation_context()
+        keys = [FitnessCache.key(model_vector, context) for model_vector in self.population]
+        results = [self.fitness_cache.get(key) for key in keys]
+        # genomes which are in the population more than once (e.g. the best one) are evaluated only once
+        missing = {}
+        for i, (key, result) in enumerate(zip(keys, results)):
+            if result is None:
+                missing.setdefault(key, i)
+        evaluated = {}
+        if missing:
+            rows = list(missing.values())
+            self._evaluated_rows = rows
+            for key, result in zip(missing, self.get_evaluator().evaluate(self.population[rows],
+                                                                          max_ticks=self.generation_ticks)):
+                evaluated[key] = result
+                self.fitness_cache.put(key, result)
+        else:
+            self._evaluated_rows = []
+        return [evaluated[key] if result is None else result for key, result in zip(keys, results)]
+
+    def record_best_replay(self):
+        best = int(np.argmax(self.fitness))
+        genome = self.population[best]
+        rows = self._evaluated_rows if self._evaluated_rows is not None else range(len(self.population))
+        if best in rows:
+            x, y, angle, actions = self.evaluator.trajectory(list(rows).index(best))
+        elif self._replay_genome is not None and np.array_equal(genome, self._replay_genome):
+            # the best genome came from the fitness cache, it is the elite of the previous generation and drives
+            # exactly the same run again
+            previous = self.replays[-1]
+            x, y, angle, actions = previous.x, previous.y, previous.angle, previous.actions
+        else:
+            return
+        self.replays.append(Replay(self.generation + 1, self.fitness[best], x, y, angle, actions))
+        self._replay_genome = genome.copy()
+
+    def train_generation(self):
+        """
+        Evaluates the current population and replaces it with the next generation.
+        :return: mean, median and best number of checkpoints of the evaluated population
+        """
+        start = time.perf_counter()
+        cache_hits, cache_misses = self.fitness_cache.hits, self.fitness_cache.misses
+        # run every AI parallel
+        self.evaluate_population()
+
+        new_population = next_generation(self.population, self.fitness, self.crossover_chance,
+                                         self.mutation_chance, self.mutation_percent_genes, self.timer)
+
+        self.generation += 1
+        results = self.fitness.tolist()
+        stats = (statistics.mean(results), statistics.median(results), max(results))
+        self.generation_stats.append(stats)
+        self.metrics = self.generation_metrics(time.perf_counter() - start, self.fitness_cache.hits - cache_hits,
+                                               self.fitness_cache.misses - cache_misses)
+        if self.metrics_writer is not None:
+            self.metrics_writer.write(self.metrics)
+
+        # the evaluated generation is kept for get_top_vectors, the new one isn't evaluated yet
+        self.evaluated_population, self.evaluated_fitness = self.population, self.fitness
+        self.population = new_population
+        self.fitness = np.full(len(self.population), -1)
+        return stats
+
+    def generation_metrics(self, seconds, cache_hits, cache_misses):
+        """
+        :return: flat dictionary describing the last evaluated generation, see metrics.MetricsWriter
+        """
+        steps = int(self.evaluated_car_steps) if self.evaluated_car_steps is not None else None
+        return {
+            "generation": self.generation,
+            "time": time.time(),
+            **fitness_metrics(self.fitness),
+            **diversity_metrics(self.population),
+            "evaluation_seconds": self.evaluation_seconds,
+            "generation_seconds": seconds,
+            "car_steps": steps,
+            "steps_per_second": steps / self.evaluation_seconds if steps and self.evaluation_seconds else None,
+            "cache_hits": cache_hits,
+            "cache_misses": cache_misses,
+        }
+
+    def get_best_vector(self):
+        return self.population[np.argmax(self.fitness)]
+
+    def get_top_vectors(self, count):
+        """
+        :return: the count best weight vectors of the last evaluated generation, best first
+        """
+        if self.evaluated_population is None:
+            return self.population[:count]
+        # stable, so that equally good individuals keep their order and the results don't depend on the sort
+        return self.evaluated_population[np.argsort(-self.evaluated_fitness, kind="stable")[:count]]
+
+    def replace_vectors(self, vectors):
+        """
+        Replaces the last rows of the population, which are children of the next generation and never the copies of
+        the best individual at the top, e.g. with migrants from other populations.
+        """
+        if not 0 < len(vectors) <= len(self.population) - ELITE_COPIES:
+            raise ValueError(f"between 1 and {len(self.population) - ELITE_COPIES} vectors can replace children of a "
+                             f"population of {len(self.population)}, not {len(vectors)}")
+        self.population[len(self.population) - len(vectors):] = vectors
+
+    # hyperparameters stored in the checkpoints and restored when the training is resumed
+    checkpoint_settings = ("population_size", "crossover_chance", "mutation_chance", "mutation_percent_genes",
+                           "generation_time", "use_tick_budget", "generation_ticks", "seed", "engine", "backend",
+                           "fitness_track_directories", "fitness_aggregate", "sensor_count", "use_fitness_cache",
+                           "record_replays")
+
+    def save_checkpoint(self, path, background=False):
+        """
+        Saves everything needed to continue the training exactly where it stopped: the population, the fitness, the
+        statistics, the hyperparameters and the state of the random number generators.
+        :param background: write the file in a background thread, see wait_for_checkpoints
+        """
+        _, keys, position, has_gauss, cached_gaussian = npr.get_state()
+        python_version, python_state, python_gauss = random.getstate()
+        stall = self.stall_rules
+        arrays = dict(population=self.population.copy(), fitness=np.array(self.fitness),
+                      generation_stats=np.array(self.generation_stats, dtype=np.float64).reshape(-1, 3),
+                      numpy_random_keys=keys.copy(), python_random_state=np.array(python_state, dtype=np.uint64))
+        metadata = dict(generation=self.generation,
+                        settings={name: getattr(self, name) for name in self.checkpoint_settings},
+                        stall_rules=[stall.progress_ticks, stall.idle_ticks, stall.idle_speed, stall.backwards_ticks]
+                        if stall is not None else None,
+                        numpy_random=[int(position), int(has_gauss), float(cached_gaussian)],
+                        python_random=[python_version, python_gauss],
+                        architecture=self.architecture.as_dict(),
+                        track=[self.track_image_path, self.track_border_image_path, self.track_data_path])
+        if background:
+            self.snapshot_writer.write(path, arrays, metadata)
+        else:
+            write_snapshot(path, arrays, metadata)
+
+    def wait_for_checkpoints(self):
+        self.snapshot_writer.wait()
+
+    def load_checkpoint(self, path):
+        """
+        Continues the training of a checkpoint written by save_checkpoint, on the track it was trained on.
+        """
+        arrays, metadata = read_snapshot(path)
+        if "track" in metadata:
+            track = metadata["track"]
+            missing = [track_path for track_path in track if not os.path.exists(track_path)]
+            if missing:
+                raise FileNotFoundError(f"the track of the checkpoint {path} is missing: {', '.join(missing)}")
+            current = [self.track_image_path, self.track_border_image_path, self.track_data_path]
+            if [os.path.realpath(track_path) for track_path in track] != [os.path.realpath(track_path)
+                                                                          for track_path in current]:
+                self.load_track(*track)
+        for name, value in metadata.get("settings", {}).items():
+            setattr(self, name, value)
+        if "architecture" in metadata:
+            self.architecture = Architecture.from_dict(metadata["architecture"])
+        if "stall_rules" in metadata:
+            self.stall_rules = StallRules(*metadata["stall_rules"]) if metadata["stall_rules"] is not None else None
+        self.population = arrays["population"]
+        self.fitness = arrays["fitness"]
+        self.generation = int(metadata.get("generation", arrays.get("generation", 0)))
+        self.generation_stats = [tuple(stats) for stats in arrays["generation_stats"].tolist()]
+        if "sensor_count" in arrays:
+            # checkpoints written before the settings were stored
+            self.sensor_count = int(arrays["sensor_count"])
+        self.population_size = len(self.population)
+        self.evaluated_population = self.evaluated_fitness = None
+        if "numpy_random_keys" in arrays:
+            position, has_gauss, cached_gaussian = metadata["numpy_random"]
+            npr.set_state(("MT19937", arrays["numpy_random_keys"], position, has_gauss, cached_gaussian))
+            python_version, python_gauss = metadata["python_random"]
+            random.setstate((python_version, tuple(arrays["python_random_state"].tolist()), python_gauss))
+        self.replays = []
+        self._replay_genome = None
+        self.close_evaluator()
+
+    def close(self):
+        self.snapshot_writer.close()
+        self.close_evaluator()
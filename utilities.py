@@ -1,6 +1,3 @@
-from collections import namedtuple
-import numpy as np
-import numpy.linalg as linalg
 import pygame
 
 
@@ -35,19 +32,37 @@ def rotate_image(image, position, origin_position, angle):
     return rotated_image, rotated_image_rect
 
 
-def distance_from_point_and_line(p1, p2, p3):
+def mask_to_array(mask: pygame.mask.Mask):
     """
-    p1, p2 - line points
-    p3 - point
+    :param mask: pygame mask
+    :return: boolean array of shape (width, height), indexed by [x, y] like the mask itself
     """
-    p1 = np.asarray(p1)
-    p2 = np.asarray(p2)
-    p3 = np.asarray(p3)
-    return linalg.norm(np.cross(p2 - p1, p1 - p3)) / linalg.norm(p2 - p1)
-
-
-def create_action_tuple():
-    return namedtuple("Action", ("throttle", "brake", "left", "right"))
+    surface = mask.to_surface(setcolor=(255, 255, 255, 255), unsetcolor=(0, 0, 0, 255))
+    return pygame.surfarray.array_red(surface) > 0
+
+
+# actions are integers with a bit for every key, so choosing and applying one never creates an object
+ACTION_NONE = 0
+ACTION_THROTTLE = 1
+ACTION_BRAKE = 2
+ACTION_LEFT = 4
+ACTION_RIGHT = 8
+
+# actions of choose_action, by index
+ACTION_CHOICES = (
+    ACTION_NONE,
+    ACTION_THROTTLE,
+    ACTION_BRAKE,
+    ACTION_LEFT,
+    ACTION_RIGHT,
+    ACTION_THROTTLE | ACTION_BRAKE,
+    ACTION_THROTTLE | ACTION_LEFT,
+    ACTION_THROTTLE | ACTION_RIGHT,
+    ACTION_BRAKE | ACTION_LEFT,
+    ACTION_BRAKE | ACTION_RIGHT,
+    ACTION_THROTTLE | ACTION_BRAKE | ACTION_LEFT,
+    ACTION_THROTTLE | ACTION_BRAKE | ACTION_RIGHT,
+)
 
 
 def choose_action(index: int):
@@ -68,48 +83,17 @@ def choose_action(index: int):
     :param index: action index
     :return: action
     """
-    action = create_action_tuple()
-    throttle = 0
-    brake = 0
-    left = 0
-    right = 0
-    if index == 1:
-        throttle = 1
-    elif index == 2:
-        brake = 1
-    elif index == 3:
-        left = 1
-    elif index == 4:
-        right = 1
-    elif index == 5:
-        throttle = 1
-        brake = 1
-    elif index == 6:
-        throttle = 1
-        left = 1
-    elif index == 7:
-        throttle = 1
-        right = 1
-    elif index == 8:
-        brake = 1
-        left = 1
-    elif index == 9:
-        brake = 1
-        right = 1
-    elif index == 10:
-        throttle = 1
-        brake = 1
-        left = 1
-    elif index == 11:
-        throttle = 1
-        brake = 1
-        right = 1
-
-    action.throttle = throttle
-    action.brake = brake
-    action.left = left
-    action.right = right
-    return action
+    return ACTION_CHOICES[index]
+
+
+def action_from_keys(keys):
+    """
+    :param keys: throttle, brake, left and right flags
+    :return: action
+    """
+    throttle, brake, left, right = keys
+    return ((ACTION_THROTTLE if throttle else 0) | (ACTION_BRAKE if brake else 0) | (ACTION_LEFT if left else 0)
+            | (ACTION_RIGHT if right else 0))
 
 
 def key_left(keys) -> bool:
@@ -129,24 +113,5 @@ def key_down(keys) -> bool:
 
 
 def get_human_player_input():
-    action = create_action_tuple()
     keys = pygame.key.get_pressed()
-
-    if key_up(keys):
-        action.throttle = 1
-    else:
-        action.throttle = 0
-    if key_down(keys):
-        action.brake = 1
-    else:
-        action.brake = 0
-    if key_left(keys):
-        action.left = 1
-    else:
-        action.left = 0
-    if key_right(keys):
-        action.right = 1
-    else:
-        action.right = 0
-
-    return action
+    return action_from_keys((key_up(keys), key_down(keys), key_left(keys), key_right(keys)))
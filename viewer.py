@@ -0,0 +1,63 @@
+import time
+
+import numpy as np
+import pygame
+
+from batch_drive import BatchDrive
+from car import CarAtlas
+from render import DirtyRenderer, transparent_copy
+
+GHOST_ALPHA = 70
+# largest share of the wall time the drawing may take, slow frames delay the next one accordingly
+MAX_DRAWING_SHARE = 0.1
+
+
+class GenerationViewer:
+    """
+    Live view of the whole population while the batch engine evaluates it. It is called after every simulation tick,
+    but draws at most fps frames per second of wall time, and never spends more than MAX_DRAWING_SHARE of the time
+    drawing. In between it returns right away, so the simulation keeps running at full speed and the view simply
+    skips the ticks in between frames.
+    Cars which crashed or were retired stay on the track as ghosts.
+    """
+
+    def __init__(self, window: pygame.Surface, track_image: pygame.Surface, car_image: pygame.Surface, fps=30):
+        self.renderer = DirtyRenderer(window, track_image)
+        self.car_atlas = CarAtlas(car_image)
+        self.ghost_atlas = CarAtlas(transparent_copy(car_image, GHOST_ALPHA))
+        self.font = pygame.font.SysFont(None, 24)
+        self.interval = 1 / fps
+        self.next_frame = 0
+        self.generation = 0
+        self.frames = 0
+
+    def __call__(self, drive: BatchDrive):
+        now = time.monotonic()
+        if now < self.next_frame:
+            return
+        self.draw(drive)
+        drawing_time = time.monotonic() - now
+        self.next_frame = now + max(self.interval, drawing_time / MAX_DRAWING_SHARE)
+
+    def sprites(self, atlas, x, y, angle):
+        # rotated images are looked up for all the cars at once, the same way as CarAtlas.get
+        entries = np.round(angle / atlas.angle_step).astype(np.int64) % len(atlas.entries)
+        for entry, car_x, car_y in zip(entries.tolist(), x.tolist(), y.tolist()):
+            entry = atlas.entries[entry]
+            yield entry.image, entry.image.get_rect(center=(car_x + entry.pivot_offset.x,
+                                                            car_y + entry.pivot_offset.y))
+
+    def draw(self, drive: BatchDrive):
+        # keeps the window responsive, the events themselves are left to the menu
+        pygame.event.pump()
+        renderer = self.renderer
+        renderer.begin()
+        dead = ~drive.alive
+        renderer.blits(self.sprites(self.ghost_atlas, drive.x[dead], drive.y[dead], drive.angle[dead]))
+        alive = drive.alive
+        renderer.blits(self.sprites(self.car_atlas, drive.x[alive], drive.y[alive], drive.angle[alive]))
+        text = (f"Generation {self.generation}  tick {int(drive.steps.max(initial=0))}  "
+                f"alive {np.count_nonzero(alive)}/{drive.size}  best {int(drive.checkpoint_counter.max(initial=0))}")
+        renderer.blit(self.font.render(text, True, (255, 255, 255), (0, 0, 0)), (10, 10))
+        renderer.end()
+        self.frames += 1